@@ -3,3 +3,63 @@ CREATE TABLE IF NOT EXISTS flagged_wallets (
     reason TEXT,
     risk_score INT DEFAULT 0  -- matches OracleDataEntry
 );
+
+-- Closest flagged wallets behind a proximity flag, written by graph_builder.py: [{"wallet", "hops"}, ...]
+ALTER TABLE flagged_wallets ADD COLUMN IF NOT EXISTS risk_sources JSONB;
+
+-- Change tracking for the AML API's resident flagged-wallet index
+ALTER TABLE flagged_wallets ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp();
+CREATE INDEX IF NOT EXISTS flagged_wallets_updated_at_idx ON flagged_wallets (updated_at);
+
+-- Stamp every inserted/updated row
+CREATE OR REPLACE FUNCTION flagged_wallets_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flagged_wallets_touch ON flagged_wallets;
+CREATE TRIGGER flagged_wallets_touch
+    BEFORE INSERT OR UPDATE ON flagged_wallets
+    FOR EACH ROW EXECUTE FUNCTION flagged_wallets_touch();
+
+-- Deleted wallets, so the index can evict them (one row per wallet, stamped at its latest deletion)
+CREATE TABLE IF NOT EXISTS flagged_wallets_deleted (
+    wallet_id TEXT PRIMARY KEY,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+CREATE INDEX IF NOT EXISTS flagged_wallets_deleted_at_idx ON flagged_wallets_deleted (deleted_at);
+
+CREATE OR REPLACE FUNCTION flagged_wallets_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO flagged_wallets_deleted (wallet_id, deleted_at)
+    VALUES (OLD.wallet_id, clock_timestamp())
+    ON CONFLICT (wallet_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flagged_wallets_tombstone ON flagged_wallets;
+CREATE TRIGGER flagged_wallets_tombstone
+    AFTER DELETE ON flagged_wallets
+    FOR EACH ROW EXECUTE FUNCTION flagged_wallets_tombstone();
+
+-- One notification per writing statement (delivered on commit), so listeners refresh right away;
+-- the payload is the operation, and TRUNCATE (which records no tombstones) makes them reload fully
+CREATE OR REPLACE FUNCTION flagged_wallets_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('flagged_wallets_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flagged_wallets_notify ON flagged_wallets;
+CREATE TRIGGER flagged_wallets_notify
+    AFTER INSERT OR UPDATE OR DELETE ON flagged_wallets
+    FOR EACH STATEMENT EXECUTE FUNCTION flagged_wallets_notify();
+
+DROP TRIGGER IF EXISTS flagged_wallets_notify_truncate ON flagged_wallets;
+CREATE TRIGGER flagged_wallets_notify_truncate
+    AFTER TRUNCATE ON flagged_wallets
+    FOR EACH STATEMENT EXECUTE FUNCTION flagged_wallets_notify();
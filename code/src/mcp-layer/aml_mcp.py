@@ -1,10 +1,9 @@
 #! D:/GitHub/Team4-CosmBlockchain/code/oracle-service/venv/Scripts/python.exe
 import os
-import pickle
+import threading
 import psycopg2
 from mcp.server.fastmcp import FastMCP   # <-- correct import for MCP runner
 from psycopg2.extras import RealDictCursor
-import networkx as nx
 from pyvis.network import Network
 import sys
 
@@ -19,7 +18,39 @@ DB_CONFIG = {
 }
 
 BASE_PATH = os.path.dirname(os.path.abspath(__file__))
-GRAPH_FILE = os.path.join(BASE_PATH, "wallet_graph.pkl") 
+GRAPH_BUILDER_DIR = os.path.join(BASE_PATH, "..", "wallet-Graph")
+GRAPH_DIR = os.environ.get("AML_GRAPH_DIR", os.path.join(GRAPH_BUILDER_DIR, "wallet_graph"))
+
+sys.path.insert(0, GRAPH_BUILDER_DIR)
+from wallet_graph_store import ShardedGraph, VersionPrunedError, current_version
+
+# ==== GRAPH ARTIFACT ====
+# Shard index mapped once and reused across tool calls; reopened when graph_builder.py publishes a
+# new version. Only the shards holding queried wallets are opened, the most recent MCP_SHARD_CACHE_SIZE kept
+SHARD_CACHE_SIZE = int(os.environ.get("MCP_SHARD_CACHE_SIZE", 4))
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_graph():
+    global _graph
+    version = current_version(GRAPH_DIR)
+    if version is None:
+        raise FileNotFoundError(f"Graph artifact not found under {GRAPH_DIR}. Build it first.")
+    with _graph_lock:
+        if _graph is None or _graph.manifest["version"] != version:
+            _graph = ShardedGraph(GRAPH_DIR, version, max_loaded=SHARD_CACHE_SIZE)
+        return _graph
+
+def shard_for(wallet_id):
+    """The graph shard holding `wallet_id` (None if absent), reopening the artifact if its version was pruned meanwhile."""
+    global _graph
+    try:
+        return get_graph().shard_for(wallet_id)
+    except VersionPrunedError:
+        with _graph_lock:
+            _graph = None
+        return get_graph().shard_for(wallet_id)
+
 # ==== INIT MCP ====
 mcp = FastMCP("AML-Wallet-Graph-MCP")   
 
@@ -81,7 +112,7 @@ def db_query(sql: str) -> list:
 @mcp.tool()
 def build_wallet_graph(wallet_id: str, max_hops: int = 2, output_file: str = "wallet_subgraph.html") -> str:
     """
-    Load the pre-built graph from .pkl and extract the neighborhood subgraph for a wallet.
+    Extract the neighborhood subgraph for a wallet from the pre-built graph artifact.
     Parameters:
         wallet_id (str): The wallet address to explore.
         max_hops (int): Number of transaction hops to include.
@@ -89,20 +120,15 @@ def build_wallet_graph(wallet_id: str, max_hops: int = 2, output_file: str = "wa
     Returns: Path to generated HTML file.
     """
 
-    if not os.path.exists(GRAPH_FILE):
-        raise FileNotFoundError(f"Graph file {GRAPH_FILE} not found. Build it first.")
-
-    # Load graph from pickle
-    with open(GRAPH_FILE, "rb") as f:
-        G = pickle.load(f)
+    # A wallet's whole connected component lives in one shard
+    graph = shard_for(wallet_id)
+    if graph is None:
+        raise ValueError(f"Wallet {wallet_id} not found in graph.")
 
     # Extract neighborhood
-    if wallet_id not in G:
-        raise ValueError(f"Wallet {wallet_id} not found in graph.")
+    root = graph.index_of(wallet_id)
 
-    lengths = nx.single_source_shortest_path_length(G.to_undirected(), wallet_id, cutoff=max_hops)
-    selected_nodes = set(lengths.keys())
-    SG = G.subgraph(selected_nodes).copy()
+    SG = graph.subgraph(graph.k_hop(root, max_hops))
 
     # Visualization
     net = Network(height="750px", width="100%", bgcolor="white", font_color="black", directed=True)
@@ -120,3 +146,29 @@ def build_wallet_graph(wallet_id: str, max_hops: int = 2, output_file: str = "wa
     net.write_html(output_path)
     return output_path
 
+
+
+# ------------------------------
+# Tool 4: Explain wallet risk
+# ------------------------------
+@mcp.tool()
+def explain_wallet_risk(wallet_id: str) -> dict:
+    """
+    Explain a wallet's risk score from the pre-built graph artifact, without searching the graph.
+    Parameters:
+        wallet_id (str): The wallet address to explain.
+    Returns: {"wallet", "risk_score", "flagged", "reason", "risk_sources"} where risk_sources lists
+    the closest flagged wallets ({"wallet", "hops"}, nearest first) that gave it proximity risk.
+    """
+    graph = shard_for(wallet_id)
+    if graph is None:
+        raise ValueError(f"Wallet {wallet_id} not found in graph.")
+
+    i = graph.index_of(wallet_id)
+    return {
+        "wallet": wallet_id,
+        "risk_score": float(graph.nodes["risk_score"][i]),
+        "flagged": bool(graph.flagged[i]),
+        "reason": graph.reason(i),
+        "risk_sources": graph.risk_sources_of(i),
+    }
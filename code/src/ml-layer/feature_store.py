@@ -0,0 +1,103 @@
+# feature_store.py
+# Offline feature store: the raw features of every wallet in the graph plus the min-max scaler
+# fitted at training time, so serving reads and scales features instead of recomputing them and
+# refitting a scaler on every request's subgraph.
+import json
+import os
+import numpy as np
+from features import FEATURE_NAMES, apply_min_max
+
+# =====================
+# Files
+# =====================
+INDEX_FILE = "wallet_index.npy"      # sorted fixed-width wallet ids (bytes)
+FEATURES_FILE = "raw_features.npy"   # float32 raw features aligned with the index, FEATURE_NAMES order
+LABELS_FILE = "risk_scores.npy"      # optional int8 training labels aligned with the index
+META_FILE = "meta.json"              # scaler, feature names, graph/model versions; written last
+
+# =====================
+# Writing
+# =====================
+def write_feature_store(directory, wallets, raw_features, scaler, meta, labels=None):
+    """
+    Write the wallet index and aligned raw feature rows (and `labels`, if given) as plain .npy
+    files (memory-mappable), and the fitted scaler `(col_min, col_range)` into meta.json.
+    `wallets` are str or an array of utf-8 bytes, as in a graph artifact.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if isinstance(wallets, np.ndarray) and wallets.dtype.kind == "S":
+        keys = np.asarray(wallets)
+    else:
+        keys = np.array([w.encode("utf-8") for w in wallets], dtype=np.bytes_)
+    rows = np.asarray(raw_features, dtype=np.float32)
+    labels = np.asarray(labels, dtype=np.int8) if labels is not None else None
+    # A graph's wallets are already sorted; only reorder (and copy) rows otherwise
+    if len(keys) > 1 and (keys[1:] < keys[:-1]).any():
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], rows[order]
+        labels = labels[order] if labels is not None else None
+
+    # Write beside the live files and swap in; meta goes last and marks the store complete
+    arrays = [(INDEX_FILE, keys), (FEATURES_FILE, rows)]
+    if labels is not None:
+        arrays.append((LABELS_FILE, labels))
+    elif os.path.exists(os.path.join(directory, LABELS_FILE)):
+        os.remove(os.path.join(directory, LABELS_FILE))  # would no longer line up with the index
+    for name, array in arrays:
+        tmp_path = os.path.join(directory, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    col_min, col_range = scaler
+    meta = dict(meta, num_wallets=int(len(keys)), feature_names=FEATURE_NAMES,
+                scaler={"min": [float(v) for v in col_min], "range": [float(v) for v in col_range]})
+    tmp_path = os.path.join(directory, META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, META_FILE))
+    return meta
+
+# =====================
+# Reading
+# =====================
+class FeatureStore:
+    """
+    Read-only view of a feature store; the index and rows are memory-mapped, so a lookup reads
+    only the rows asked for. With `rows=False` only the scaler is loaded (e.g. when the rows
+    were written for another graph version).
+    """
+
+    def __init__(self, directory, rows=True):
+        with open(store_meta_path(directory), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("feature_names") != FEATURE_NAMES:
+            raise ValueError(f"Feature store {directory} has features {self.meta.get('feature_names')}, expected {FEATURE_NAMES}")
+        self.col_min = np.array(self.meta["scaler"]["min"])
+        self.col_range = np.array(self.meta["scaler"]["range"])
+        self.index = np.load(os.path.join(directory, INDEX_FILE), mmap_mode="r") if rows else None
+        self.rows = np.load(os.path.join(directory, FEATURES_FILE), mmap_mode="r") if rows else None
+        labels_path = os.path.join(directory, LABELS_FILE)
+        self.labels = np.load(labels_path, mmap_mode="r") if rows and os.path.exists(labels_path) else None
+
+    def __len__(self):
+        return len(self.index) if self.index is not None else 0
+
+    def positions(self, wallets):
+        """Row of each wallet (utf-8 bytes array, e.g. a graph's wallet ids), -1 where it is not stored."""
+        wallets = np.asarray(wallets)
+        if self.index is None or len(self.index) == 0:
+            return np.full(len(wallets), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.index, wallets), len(self.index) - 1)
+        return np.where(self.index[pos] == wallets, pos, -1)
+
+    def raw(self, positions):
+        """Raw feature rows at `positions` (all >= 0)."""
+        return np.asarray(self.rows[positions], dtype=np.float64)
+
+    def scale(self, X):
+        """X scaled with the scaler fitted at training time."""
+        return apply_min_max(X, self.col_min, self.col_range)
+
+def store_meta_path(directory):
+    return os.path.join(directory, META_FILE)
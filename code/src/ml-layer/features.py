@@ -0,0 +1,134 @@
+# features.py
+# Node features shared by training (ml_model.py) and serving (ml_risk_calculator.py), so the
+# model sees identical features in both by construction.
+import numpy as np
+
+# Node attribute columns read from the wallet graph, in feature order
+STAT_COLUMNS = ["incoming_count", "outgoing_count", "total_sent", "total_received", "avg_fee"]
+
+FEATURE_NAMES = [
+    "degree", "in_degree", "out_degree",
+    "incoming_count", "outgoing_count",
+    "total_sent", "total_received",
+    "avg_fee", "tx_volume",
+    "neighbor_risk_mean", "neighbor_risk_max",
+]
+NUM_FEATURES = len(FEATURE_NAMES)
+
+# CSR entries (at least one per node) aggregated per block by csr_feature_columns, and rows per
+# block written by write_feature_rows
+EDGE_BLOCK = 4_000_000
+ROW_BLOCK = 1_000_000
+
+# =====================
+# Scaling
+# =====================
+def fit_min_max(X):
+    """Per-column (min, range) of X, as MinMaxScaler would fit them; constant columns get range 1."""
+    col_min = X.min(axis=0)
+    col_range = X.max(axis=0) - col_min
+    col_range[col_range == 0] = 1.0
+    return col_min, col_range
+
+def apply_min_max(X, col_min, col_range):
+    """Scale X with fitted (min, range); values outside the fitted range land outside [0, 1], as with sklearn."""
+    return (X - col_min) / col_range
+
+def min_max_scale(X):
+    """Column-wise scaling to [0, 1], matching sklearn's MinMaxScaler (constant columns map to 0)."""
+    return apply_min_max(X, *fit_min_max(X))
+
+# =====================
+# Feature extraction
+# =====================
+def node_features(num_nodes, src, dst, stats, risk):
+    """
+    Raw feature matrix (num_nodes x NUM_FEATURES, in FEATURE_NAMES order) for the edges src -> dst
+    between node ids < num_nodes. `stats` maps STAT_COLUMNS to per-node arrays (missing columns
+    read as 0) and `risk` holds per-node risk scores. Degrees count edges and neighbour risk runs
+    over successors plus predecessors, as NetworkX's degree/successors/predecessors would.
+    """
+    n = num_nodes
+    in_degree = np.bincount(dst, minlength=n).astype(np.float64)
+    out_degree = np.bincount(src, minlength=n).astype(np.float64)
+    degree = in_degree + out_degree
+
+    columns = {col: np.asarray(stats[col], dtype=np.float64) if col in stats else np.zeros(n) for col in STAT_COLUMNS}
+    tx_volume = columns["incoming_count"] + columns["outgoing_count"]
+
+    # Each edge contributes the successor's risk to its source and the predecessor's risk to its target
+    risk = np.asarray(risk, dtype=np.float64)
+    neighbor_risk_sum = np.bincount(src, weights=risk[dst], minlength=n) + np.bincount(dst, weights=risk[src], minlength=n)
+    neighbor_risk_mean = np.divide(neighbor_risk_sum, degree, out=np.zeros(n), where=degree > 0)
+    neighbor_risk_max = np.zeros(n)
+    np.maximum.at(neighbor_risk_max, src, risk[dst])
+    np.maximum.at(neighbor_risk_max, dst, risk[src])
+
+    return np.column_stack([
+        degree, in_degree, out_degree,
+        columns["incoming_count"], columns["outgoing_count"],
+        columns["total_sent"], columns["total_received"],
+        columns["avg_fee"], tx_volume,
+        neighbor_risk_mean, neighbor_risk_max
+    ])
+
+def store_features(store):
+    """Raw features of every node of a WalletGraphStore, plus its edge list as (src, dst) node ids."""
+    src = store.edge_sources()
+    dst = np.asarray(store.indices, dtype=np.int64)
+    stats = {col: store.nodes[col] for col in STAT_COLUMNS if col in store.nodes}
+    return node_features(store.num_nodes, src, dst, stats, store.nodes["risk_score"]), src, dst
+
+def csr_feature_columns(indptr, indices, stats, risk, block_edges=EDGE_BLOCK):
+    """
+    The FEATURE_NAMES columns as per-node vectors, aggregated from the out-edge CSR (indptr,
+    indices) a block of rows at a time, so no edge list is built and memory-mapped arrays are
+    read block by block. Equal to the columns of node_features over the same edges; stat
+    columns are returned as given (cast when rows are written).
+    """
+    n = len(indptr) - 1
+    risk = np.asarray(risk, dtype=np.float64)
+    out_degree = np.diff(np.asarray(indptr)).astype(np.float64)
+    in_degree = np.zeros(n)
+    neighbor_risk_sum = np.zeros(n)
+    neighbor_risk_max = np.zeros(n)
+    # Blocks span at least n entries, so the per-block bincounts over n stay linear overall
+    block_edges = max(block_edges, n)
+    a = 0
+    while a < n:
+        b = min(max(int(np.searchsorted(indptr, int(indptr[a]) + block_edges, side="right")) - 1, a + 1), n)
+        lo, hi = int(indptr[a]), int(indptr[b])
+        src = np.repeat(np.arange(a, b, dtype=np.int64), np.diff(np.asarray(indptr[a:b + 1])))
+        dst = np.asarray(indices[lo:hi], dtype=np.int64)
+        in_degree += np.bincount(dst, minlength=n)
+        neighbor_risk_sum += np.bincount(src, weights=risk[dst], minlength=n) + np.bincount(dst, weights=risk[src], minlength=n)
+        np.maximum.at(neighbor_risk_max, src, risk[dst])
+        np.maximum.at(neighbor_risk_max, dst, risk[src])
+        a = b
+
+    degree = in_degree + out_degree
+    columns = {col: stats[col] if col in stats else np.zeros(n) for col in STAT_COLUMNS}
+    tx_volume = np.asarray(columns["incoming_count"], dtype=np.float64) + np.asarray(columns["outgoing_count"], dtype=np.float64)
+    return [
+        degree, in_degree, out_degree,
+        columns["incoming_count"], columns["outgoing_count"],
+        columns["total_sent"], columns["total_received"],
+        columns["avg_fee"], tx_volume,
+        np.divide(neighbor_risk_sum, degree, out=np.zeros(n), where=degree > 0), neighbor_risk_max,
+    ]
+
+def fit_min_max_columns(columns):
+    """fit_min_max over feature columns given as separate per-node vectors."""
+    col_min = np.array([float(np.min(c)) if len(c) else 0.0 for c in columns])
+    col_range = np.array([float(np.max(c)) if len(c) else 0.0 for c in columns]) - col_min
+    col_range[col_range == 0] = 1.0
+    return col_min, col_range
+
+def write_feature_rows(columns, out, scaler=None, block_rows=ROW_BLOCK):
+    """Fill `out` (num_nodes x NUM_FEATURES, e.g. a float32 memmap) from per-node columns, scaled when `scaler` is given."""
+    n = len(out)
+    for a in range(0, n, block_rows):
+        b = min(a + block_rows, n)
+        block = np.column_stack([np.asarray(c[a:b], dtype=np.float64) for c in columns])
+        out[a:b] = apply_min_max(block, *scaler) if scaler is not None else block
+    return out
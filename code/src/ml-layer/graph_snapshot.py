@@ -0,0 +1,111 @@
+# graph_snapshot.py
+import numpy as np
+from features import STAT_COLUMNS, node_features
+
+# =====================
+# Array helpers
+# =====================
+def gather_rows(indptr, indices, rows):
+    """Concatenated adjacency of `rows` in a CSR structure, plus the row each entry came from."""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=indices.dtype), np.empty(0, dtype=rows.dtype)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    positions = offsets + np.arange(total)
+    return indices[positions], np.repeat(rows, lengths)
+
+def build_csr(num_nodes, src, dst):
+    """CSR (indptr, indices) of the edges src -> dst, rows sorted by src."""
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+    return indptr, dst[order].astype(np.int64)
+
+# =====================
+# CSR/CSC snapshot of the wallet graph
+# =====================
+class GraphSnapshot:
+    """
+    Array-backed view of the wallet graph for request-time feature extraction.
+
+    Node i is `wallets[i]` (sorted utf-8 bytes, looked up by binary search). Out-edges
+    are stored as CSR and in-edges as CSC (the CSR of the reversed graph), node stats and
+    risk as columns indexed by node id. All arrays may be memory-mapped.
+    """
+
+    def __init__(self, wallets, out_indptr, out_indices, in_indptr, in_indices, columns, risk):
+        self.wallets = wallets
+        self.out_indptr = out_indptr
+        self.out_indices = out_indices
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+        self.columns = columns
+        self.risk = risk
+
+    @classmethod
+    def from_store(cls, store):
+        """View over a WalletGraphStore (e.g. an opened graph artifact) without copying its arrays."""
+        in_indptr, in_indices = store.in_csr()
+        columns = {col: store.nodes[col] for col in STAT_COLUMNS if col in store.nodes}
+        return cls(store.wallets, store.indptr, store.indices, in_indptr, in_indices,
+                   columns, store.nodes["risk_score"])
+
+    @property
+    def num_nodes(self):
+        return len(self.wallets)
+
+    @property
+    def num_edges(self):
+        return len(self.out_indices)
+
+    def index_of(self, wallet):
+        """Node id of `wallet`, or None if it is not in the graph."""
+        key = wallet.encode("utf-8")
+        if len(key) > self.wallets.dtype.itemsize:
+            return None
+        i = int(np.searchsorted(self.wallets, key))
+        if i < self.num_nodes and self.wallets[i] == key:
+            return i
+        return None
+
+    def __contains__(self, wallet):
+        return self.index_of(wallet) is not None
+
+    def stat(self, col, nodes):
+        """Stat column `col` for `nodes`; columns the graph does not record read as 0."""
+        column = self.columns.get(col)
+        if column is None:
+            return np.zeros(len(nodes))
+        return np.asarray(column[nodes], dtype=np.float64)
+
+    # =====================
+    # Extraction
+    # =====================
+    def k_hop(self, root, max_hops=2):
+        """Sorted ids of all nodes within `max_hops` of `root`, ignoring edge direction."""
+        visited = np.array([root], dtype=np.int64)
+        frontier = visited
+        for _ in range(max_hops):
+            if len(frontier) == 0:
+                break
+            succ, _ = gather_rows(self.out_indptr, self.out_indices, frontier)
+            pred, _ = gather_rows(self.in_indptr, self.in_indices, frontier)
+            reached = np.unique(np.concatenate([succ, pred]))
+            frontier = reached[~np.isin(reached, visited, assume_unique=True)]
+            visited = np.union1d(visited, frontier)
+        return visited
+
+    def induced_edges(self, nodes):
+        """Edges among the sorted node ids `nodes`, as local (row, col) indices into `nodes`."""
+        dst, src = gather_rows(self.out_indptr, self.out_indices, nodes)
+        pos = np.searchsorted(nodes, dst)
+        pos[pos == len(nodes)] = 0
+        keep = nodes[pos] == dst
+        return np.searchsorted(nodes, src[keep]), pos[keep]
+
+    def node_features(self, nodes, src, dst):
+        """Raw feature matrix (see features.py) for `nodes` given the local edge list (src, dst) among them."""
+        stats = {col: self.stat(col, nodes) for col in STAT_COLUMNS}
+        return node_features(len(nodes), src, dst, stats, self.risk[nodes])
@@ -1,89 +1,65 @@
 # wallet_gcn_model.py
+# GCN training pipeline: importable (`train(...)`) and runnable as a script with CLI options.
 import os
-import pickle
+import sys
+import copy
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime, timezone
 import numpy as np
-from tqdm import tqdm
 import torch
 import torch.nn.functional as F
 from torch_geometric.data import Data
 from torch_geometric.nn import GCNConv
-from sklearn.preprocessing import MinMaxScaler
+from features import (STAT_COLUMNS, NUM_FEATURES, ROW_BLOCK, fit_min_max, apply_min_max, store_features, csr_feature_columns,
+                      fit_min_max_columns, write_feature_rows)
+from feature_store import FeatureStore, write_feature_store, store_meta_path
+from risk_table import model_digest
+from neighbor_sampler import NeighborSampler, sampled_loader
 
 # =====================
 # Paths
 # =====================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-GRAPH_PICKLE = os.path.join(BASE_DIR, "..", "wallet-Graph", "wallet_graph.pkl")
+GRAPH_BUILDER_DIR = os.path.join(BASE_DIR, "..", "wallet-Graph")
+GRAPH_DIR = os.environ.get("AML_GRAPH_DIR", os.path.join(GRAPH_BUILDER_DIR, "wallet_graph"))
 MODEL_SAVE_PATH = os.path.join(BASE_DIR, "wallet_gcn_model.pth")
+# Raw per-wallet features + the fitted scaler, read by ml_risk_calculator.py at serving time
+FEATURE_STORE_DIR = os.environ.get("AML_FEATURE_STORE_DIR", os.path.join(BASE_DIR, "feature_store"))
+# One JSON report per training run
+REPORT_DIR = os.environ.get("GCN_REPORT_DIR", os.path.join(BASE_DIR, "training_runs"))
 
-# =====================
-# Load Graph
-# =====================
-print("[INFO] Loading wallet graph...")
-with open(GRAPH_PICKLE, "rb") as f:
-    G = pickle.load(f)
-
-nodes = list(G.nodes())
-node_to_idx = {node: i for i, node in enumerate(nodes)}
+sys.path.insert(0, GRAPH_BUILDER_DIR)
+from wallet_graph_store import WalletGraphStore, gather_rows, transpose_csr
 
 # =====================
-# Prepare Node Features & Labels
+# Training Defaults
 # =====================
-print("[INFO] Preparing node features...")
-node_features = []
-risk_labels = []
-
-for node in tqdm(nodes):
-    data = G.nodes[node]
-
-    # Minimal numeric features
-    degree = G.degree(node)
-    in_degree = G.in_degree(node) if hasattr(G, "in_degree") else degree
-    out_degree = G.out_degree(node) if hasattr(G, "out_degree") else degree
-    incoming_count = data.get("incoming_count", 0)
-    outgoing_count = data.get("outgoing_count", 0)
-    total_sent = data.get("total_sent", 0)
-    total_received = data.get("total_received", 0)
-    avg_fee = data.get("avg_fee", 0)
-    tx_volume = incoming_count + outgoing_count
-
-    # Neighbor risk aggregates
-    neighbors = list(G.successors(node)) + list(G.predecessors(node))
-    neighbor_risks = [G.nodes[n].get("risk_score", 0) for n in neighbors]
-    neighbor_risk_mean = np.mean(neighbor_risks) if neighbor_risks else 0
-    neighbor_risk_max = np.max(neighbor_risks) if neighbor_risks else 0
+# "full": the whole graph every step; "minibatch": neighbour-sampled batches of seed nodes, so
+# per-step memory depends on GCN_BATCH_SIZE and GCN_FANOUTS rather than on the graph
+TRAIN_MODE = os.environ.get("GCN_TRAIN_MODE", "full")
+BATCH_SIZE = int(os.environ.get("GCN_BATCH_SIZE", 1024))
+FANOUTS = tuple(int(f) for f in os.environ.get("GCN_FANOUTS", "15,10").split(","))  # per GCN layer
+LOADER_WORKERS = int(os.environ.get("GCN_LOADER_WORKERS", min(4, os.cpu_count() or 1)))
 
-    node_features.append([
-        degree, in_degree, out_degree,
-        incoming_count, outgoing_count,
-        total_sent, total_received,
-        avg_fee, tx_volume,
-        neighbor_risk_mean, neighbor_risk_max
-    ])
+# Incremental mode: warm-start from the saved model and fine-tune only on wallets whose features
+# or labels differ from the snapshot saved with the checkpoint, plus their GCN receptive field
+INCREMENTAL = os.environ.get("GCN_INCREMENTAL", "0") == "1"
+EPOCHS = int(os.environ.get("GCN_EPOCHS", 50))
+# Epochs without a validation-loss improvement before stopping (0 = run all epochs);
+# unset means 10, or 5 when fine-tuning
+PATIENCE = int(os.environ["GCN_PATIENCE"]) if "GCN_PATIENCE" in os.environ else None
+HIDDEN_DIM = 64
+LEARNING_RATE = 0.01
+VAL_FRACTION = 0.3
+SEED = 0
 
-    # Risk label
-    risk_labels.append(data.get("risk_score", 0))
+NUM_LAYERS = 2  # hops a node's output depends on
+NUM_RISK_CLASSES = 11
 
-X = np.array(node_features, dtype=np.float64)
-y_risk = np.array(risk_labels, dtype=np.int64)
-
-# Scale numeric features
-X = MinMaxScaler().fit_transform(X)
-
-# =====================
-# Prepare Edge Index
-# =====================
-edges = [[node_to_idx[u], node_to_idx[v]] for u, v in G.edges()]
-edge_index = torch.tensor(edges, dtype=torch.long).t().contiguous() if edges else torch.zeros((2, 0), dtype=torch.long)
-
-# =====================
-# PyG Data Object
-# =====================
-data = Data(
-    x=torch.tensor(X, dtype=torch.float),
-    edge_index=edge_index,
-    y_risk=torch.tensor(y_risk, dtype=torch.long)
-)
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 # =====================
 # Minimal GCN Model
@@ -107,51 +83,427 @@ class GCN(torch.nn.Module):
         return risk_out
 
 # =====================
-# Training Setup
+# Data Preparation
 # =====================
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = GCN(in_dim=X.shape[1]).to(device)
-data = data.to(device)
+def load_graph(graph_dir=GRAPH_DIR):
+    print("[INFO] Loading wallet graph...")
+    store = WalletGraphStore.open_artifact(graph_dir)
+    print(f"[INFO] Graph artifact {store.manifest['version']}: {store.num_nodes} nodes, {store.num_edges} edges")
+    return store
+
+def prepare_features(store, scaler=None):
+    """
+    (raw features, scaled features, src, dst, labels, scaler); features are vectorized over the
+    edge list, as at inference time. The min-max `scaler` (col_min, col_range) is fitted on the
+    whole graph unless one is given.
+    """
+    print("[INFO] Preparing node features...")
+    X_raw, src, dst = store_features(store)
+    y_risk = np.asarray(store.nodes["risk_score"]).astype(np.int64)
+    if scaler is None:
+        scaler = fit_min_max(X_raw)
+    return X_raw, apply_min_max(X_raw, *scaler), src, dst, y_risk, scaler
+
+def map_features(store, scaler=None, scratch_dir=None):
+    """
+    Mini-batch counterpart of prepare_features: (raw features, scaled features, labels, scaler)
+    with both feature matrices written as float32 .npy memmaps under `scratch_dir`. Features are
+    aggregated from the CSR a block at a time, so memory holds a few per-node vectors but no
+    edge list or in-memory feature matrix.
+    """
+    print("[INFO] Preparing node features (memory-mapped)...")
+    stats = {col: store.nodes[col] for col in STAT_COLUMNS if col in store.nodes}
+    columns = csr_feature_columns(store.indptr, store.indices, stats, store.nodes["risk_score"])
+    if scaler is None:
+        scaler = fit_min_max_columns(columns)
+    shape = (store.num_nodes, NUM_FEATURES)
+    X_raw = write_feature_rows(columns, np.lib.format.open_memmap(os.path.join(scratch_dir, "raw.npy"), "w+", np.float32, shape))
+    X = write_feature_rows(columns, np.lib.format.open_memmap(os.path.join(scratch_dir, "scaled.npy"), "w+", np.float32, shape), scaler)
+    X_raw.flush()
+    X.flush()
+    y_risk = np.asarray(store.nodes["risk_score"]).astype(np.int64)
+    return X_raw, X, y_risk, scaler
+
+def receptive_field(out_csr, in_csr, seeds, hops=NUM_LAYERS):
+    """Sorted ids within `hops` of any of `seeds` (inclusive), ignoring edge direction, read row by row from the out- and in-edge CSRs."""
+    visited = np.unique(np.asarray(seeds, dtype=np.int64))
+    frontier = visited
+    for _ in range(hops):
+        if len(frontier) == 0:
+            break
+        reached = np.unique(np.concatenate([gather_rows(*out_csr, frontier), gather_rows(*in_csr, frontier)]))
+        frontier = reached[~np.isin(reached, visited, assume_unique=True)]
+        visited = np.union1d(visited, frontier)
+    return visited
 
-optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
-criterion = torch.nn.CrossEntropyLoss()
+def stratified_split(y, val_fraction=VAL_FRACTION, seed=SEED):
+    """Sorted (train, validation) node ids with each label split in the same proportion; singleton labels go to training."""
+    rng = np.random.default_rng(seed)
+    val = []
+    for label in np.unique(y):
+        members = rng.permutation(np.flatnonzero(y == label))
+        if len(members) > 1:
+            val.append(members[:max(1, int(round(val_fraction * len(members))))])
+    val_idx = np.sort(np.concatenate(val)) if val else np.empty(0, dtype=np.int64)
+    train_idx = np.setdiff1d(np.arange(len(y)), val_idx, assume_unique=True)
+    return train_idx, val_idx
 
-# Train/test split
-num_nodes = data.num_nodes
-indices = np.arange(num_nodes)
-train_idx = indices[:int(0.7 * num_nodes)]
-test_idx = indices[int(0.7 * num_nodes):]
+def snapshot_dir(model_path):
+    """Feature store holding the raw features and labels a checkpoint was trained on (never refreshed)."""
+    return os.path.splitext(model_path)[0] + "_features"
+
+def changed_nodes(wallets, X_raw, y_risk, base, block_rows=ROW_BLOCK):
+    """Node ids whose wallet is not in the FeatureStore `base` or whose raw features (as stored, float32) or label differ there."""
+    changed = []
+    for a in range(0, len(wallets), block_rows):
+        b = min(a + block_rows, len(wallets))
+        pos = base.positions(wallets[a:b])
+        diff = pos < 0
+        found = np.flatnonzero(~diff)
+        rows = np.asarray(X_raw[a:b], dtype=np.float32)[found]
+        diff[found] = (rows != base.rows[pos[found]]).any(axis=1) | (y_risk[a:b][found] != base.labels[pos[found]])
+        changed.append(a + np.flatnonzero(diff))
+    return np.concatenate(changed) if changed else np.empty(0, dtype=np.int64)
+
+def incremental_targets(store, X_raw, y_risk, in_csr, model_path):
+    """Wallets to fine-tune on: changed since the checkpoint's training snapshot plus everything within NUM_LAYERS hops; None = all."""
+    directory = snapshot_dir(model_path)
+    base = FeatureStore(directory) if os.path.exists(store_meta_path(directory)) else None
+    if base is None or base.labels is None or base.meta.get("model_version") != model_digest(model_path):
+        print(f"[INFO] No training snapshot matching {model_path} in {directory}; fine-tuning on all wallets")
+        return None
+    changed = changed_nodes(store.wallets, X_raw, y_risk, base)
+    targets = receptive_field((store.indptr, store.indices), in_csr, changed, NUM_LAYERS)
+    print(f"[INFO] Fine-tuning from graph {base.meta.get('graph_version')}: {len(changed)} changed wallets, "
+          f"{len(targets)} within {NUM_LAYERS} hops")
+    return targets
+
+# =====================
+# Metrics
+# =====================
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where it cannot be read)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KB elsewhere
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
 
-train_mask = torch.zeros(num_nodes, dtype=torch.bool)
-train_mask[train_idx] = True
-test_mask = torch.zeros(num_nodes, dtype=torch.bool)
-test_mask[test_idx] = True
+def confusion(y, pred, num_classes=NUM_RISK_CLASSES):
+    return torch.bincount(y * num_classes + pred, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
 
-data.train_mask = train_mask
-data.test_mask = test_mask
+def summarize(loss_sum, matrix):
+    """Loss, accuracy and macro F1 (over labels present in either truth or prediction) from a confusion matrix."""
+    matrix = matrix.cpu().numpy().astype(np.float64)
+    seen = matrix.sum()
+    tp = np.diag(matrix)
+    support, predicted = matrix.sum(axis=1), matrix.sum(axis=0)
+    present = (support + predicted) > 0
+    f1 = np.divide(2 * tp, support + predicted, out=np.zeros_like(tp), where=present)
+    return {
+        "loss": float(loss_sum / seen) if seen else float("nan"),
+        "accuracy": float(tp.sum() / seen) if seen else float("nan"),
+        "macro_f1": float(f1[present].mean()) if present.any() else float("nan"),
+    }
 
 # =====================
-# Training Loop
+# Epochs
 # =====================
-print("[INFO] Training GCN...")
-for epoch in range(1, 51):
+def train_full_epoch(model, optimizer, criterion, data):
     model.train()
     optimizer.zero_grad()
     risk_out = model(data.x, data.edge_index)
     loss = criterion(risk_out[data.train_mask], data.y_risk[data.train_mask])
     loss.backward()
     optimizer.step()
+    return loss.item()
 
+def evaluate_full(model, criterion, data):
+    """Validation metrics on data.val_mask, without dropout."""
     model.eval()
     with torch.no_grad():
-        pred_risk = risk_out[data.test_mask].argmax(dim=1)
-        acc_risk = (pred_risk == data.y_risk[data.test_mask]).sum().item() / data.test_mask.sum().item()
-    print(f"Epoch {epoch:02d}, Loss: {loss.item():.4f}, Test Risk Accuracy: {acc_risk*100:.2f}%")
+        risk_out = model(data.x, data.edge_index)[data.val_mask]
+        y = data.y_risk[data.val_mask]
+        loss_sum = criterion(risk_out, y).item() * len(y)
+        return summarize(loss_sum, confusion(y, risk_out.argmax(dim=1)))
+
+def train_minibatch_epoch(model, optimizer, criterion, loader):
+    """Mean loss over the seed nodes of `loader`, stepping the optimizer per batch."""
+    model.train()
+    total_loss, seen = 0.0, 0
+    for batch in loader:
+        batch = batch.to(device)
+        risk_out = model(batch.x, batch.edge_index)[:batch.batch_size]
+        loss = criterion(risk_out, batch.y[:batch.batch_size])
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        total_loss += loss.item() * batch.batch_size
+        seen += batch.batch_size
+    return total_loss / max(seen, 1)
+
+def evaluate_minibatch(model, criterion, loader):
+    model.eval()
+    loss_sum, matrix = 0.0, torch.zeros((NUM_RISK_CLASSES, NUM_RISK_CLASSES), dtype=torch.long, device=device)
+    with torch.no_grad():
+        for batch in loader:
+            batch = batch.to(device)
+            risk_out = model(batch.x, batch.edge_index)[:batch.batch_size]
+            y = batch.y[:batch.batch_size]
+            loss_sum += criterion(risk_out, y).item() * batch.batch_size
+            matrix += confusion(y, risk_out.argmax(dim=1))
+    return summarize(loss_sum, matrix)
 
 # =====================
-# Save Model
+# Pipeline
 # =====================
-torch.save({
-    "model_state": model.state_dict()
-}, MODEL_SAVE_PATH)
-print(f"[INFO] Trained model saved to {MODEL_SAVE_PATH}")
+def train(graph_dir=GRAPH_DIR, model_path=MODEL_SAVE_PATH, report_dir=REPORT_DIR,
+          feature_store_dir=FEATURE_STORE_DIR, epochs=EPOCHS,
+          hidden_dim=HIDDEN_DIM, lr=LEARNING_RATE, seed=SEED, val_fraction=VAL_FRACTION, patience=PATIENCE,
+          train_mode=TRAIN_MODE, batch_size=BATCH_SIZE, fanouts=FANOUTS, loader_workers=LOADER_WORKERS,
+          incremental=INCREMENTAL):
+    """
+    Train (or, with `incremental`, fine-tune) the GCN on the current graph artifact, save the
+    checkpoint to `model_path`, the wallets' raw features and the fitted scaler to `feature_store_dir`
+    and a JSON run report under `report_dir`. Returns the report.
+    """
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    if patience is None:
+        patience = 5 if incremental else 10
+    torch.manual_seed(seed)
+
+    store = load_graph(graph_dir)
+    graph_version = store.manifest["version"]
+
+    checkpoint, targets, scaler = None, None, None
+    if incremental:
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Incremental training needs an existing checkpoint at {model_path}")
+        checkpoint = torch.load(model_path, map_location="cpu")
+        base_version = checkpoint.get("graph_version")
+        if base_version == graph_version:
+            print(f"[INFO] Checkpoint already trained on graph {base_version}; nothing to do")
+            return {"status": "up_to_date", "graph_version": graph_version, "model_path": model_path}
+        hidden_dim = checkpoint.get("hidden_dim", hidden_dim)
+        # Fine-tuned weights expect inputs scaled the way the checkpoint was trained
+        if "scaler" in checkpoint:
+            scaler = (np.array(checkpoint["scaler"]["min"]), np.array(checkpoint["scaler"]["range"]))
+
+    if train_mode == "minibatch":
+        # Features, labels and the in-edge CSR are memory-mapped from a scratch directory, so
+        # resident memory follows the batches rather than the graph
+        scratch = tempfile.TemporaryDirectory(prefix="gcn_train_", ignore_cleanup_errors=True)
+        X_raw, X, y_risk, scaler = map_features(store, scaler, scratch.name)
+        in_indices = np.lib.format.open_memmap(os.path.join(scratch.name, "in_indices.npy"), "w+", np.int64, (store.num_edges,))
+        in_csr = transpose_csr(store.indptr, store.indices, out=in_indices)
+        in_indices.flush()
+    else:
+        scratch = None
+        X_raw, X, src, dst, y_risk, scaler = prepare_features(store, scaler)
+    feature_secs = time.perf_counter() - start
+    if checkpoint is not None:
+        targets = incremental_targets(store, X_raw, y_risk, in_csr if scratch is not None else store.in_csr(), model_path)
+
+    # Stratified random split; fine-tuning splits only the affected wallets
+    if targets is None:
+        train_idx, val_idx = stratified_split(y_risk, val_fraction, seed)
+    else:
+        local_train, local_val = stratified_split(y_risk[targets], val_fraction, seed)
+        if len(local_val) == 0 and len(targets) > 1:
+            # Every label occurs once: hold out a random share regardless of label
+            order = np.random.default_rng(seed).permutation(len(targets))
+            cut = max(1, int(round(val_fraction * len(targets))))
+            local_train, local_val = np.sort(order[cut:]), np.sort(order[:cut])
+        train_idx, val_idx = targets[local_train], targets[local_val]
+    if len(val_idx) == 0 and patience:
+        print("[INFO] No wallets to validate on; early stopping disabled")
+        patience = 0
+
+    # =====================
+    # Training Setup
+    # =====================
+    model = GCN(in_dim=X.shape[1], hidden_dim=hidden_dim).to(device)
+    if checkpoint is not None:
+        model.load_state_dict(checkpoint["model_state"])
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    criterion = torch.nn.CrossEntropyLoss()
+
+    if train_mode == "minibatch":
+        # Features and labels are gathered per batch for the sampled nodes only
+        sampler = NeighborSampler(*in_csr, fanouts)
+        train_loader = sampled_loader(sampler, X, y_risk, train_idx, batch_size, shuffle=True, num_workers=loader_workers)
+        val_loader = sampled_loader(sampler, X, y_risk, val_idx, batch_size, shuffle=False, num_workers=loader_workers)
+        print(f"[INFO] Mini-batch training: batch size {batch_size}, fan-outs {tuple(fanouts)}, {loader_workers} loader workers")
+    else:
+        data = Data(
+            x=torch.tensor(X, dtype=torch.float),
+            edge_index=torch.from_numpy(np.vstack([src, dst])),
+            y_risk=torch.tensor(y_risk, dtype=torch.long)
+        )
+        data.train_mask = torch.zeros(store.num_nodes, dtype=torch.bool)
+        data.train_mask[train_idx] = True
+        data.val_mask = torch.zeros(store.num_nodes, dtype=torch.bool)
+        data.val_mask[val_idx] = True
+        data = data.to(device)
+
+    # =====================
+    # Training Loop
+    # =====================
+    print(f"[INFO] Training GCN on {len(train_idx)} wallets, validating on {len(val_idx)}...")
+    history = []
+    best_loss, best_state, best_epoch, stale = float("inf"), None, 0, 0
+    for epoch in range(1, epochs + 1):
+        if len(train_idx) == 0:
+            print("[INFO] No wallets to train on")
+            break
+        epoch_start = time.perf_counter()
+        if train_mode == "minibatch":
+            loss_value = train_minibatch_epoch(model, optimizer, criterion, train_loader)
+            train_secs = time.perf_counter() - epoch_start
+            val = evaluate_minibatch(model, criterion, val_loader)
+        else:
+            loss_value = train_full_epoch(model, optimizer, criterion, data)
+            train_secs = time.perf_counter() - epoch_start
+            val = evaluate_full(model, criterion, data)
+        epoch_secs = time.perf_counter() - epoch_start
+        history.append({
+            "epoch": epoch,
+            "seconds": round(epoch_secs, 4),
+            "train_loss": loss_value,
+            "val_loss": val["loss"],
+            "val_accuracy": val["accuracy"],
+            "val_macro_f1": val["macro_f1"],
+            "train_nodes_per_sec": round(len(train_idx) / train_secs, 1) if train_secs > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        print(f"Epoch {epoch:02d}, Loss: {loss_value:.4f}, Val Loss: {val['loss']:.4f}, "
+              f"Val Risk Accuracy: {val['accuracy']*100:.2f}%, {epoch_secs:.2f}s")
+
+        # Early stopping on a validation-loss plateau; the best epoch's weights are kept
+        if val["loss"] < best_loss:
+            best_loss, best_state, best_epoch, stale = val["loss"], copy.deepcopy(model.state_dict()), epoch, 0
+        else:
+            stale += 1
+            if patience and stale >= patience:
+                print(f"[INFO] Validation loss has not improved for {patience} epochs; stopping at epoch {epoch}")
+                break
+    if best_state is not None:
+        model.load_state_dict(best_state)
+        print(f"[INFO] Keeping weights from epoch {best_epoch} (val loss {best_loss:.4f})")
+
+    # =====================
+    # Save Model
+    # =====================
+    # graph_version lets the next incremental run find what changed since this checkpoint
+    mode = "incremental" if incremental else "full"
+    torch.save({
+        "model_state": model.state_dict(),
+        "in_dim": X.shape[1],
+        "hidden_dim": hidden_dim,
+        "scaler": {"min": scaler[0].tolist(), "range": scaler[1].tolist()},
+        "graph_version": graph_version,
+        "parent_graph_version": checkpoint.get("graph_version") if checkpoint is not None else None,
+        "mode": mode,
+        "epochs": len(history),
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+    }, model_path)
+    print(f"[INFO] Trained model saved to {model_path}")
+
+    # What this checkpoint was trained on, for the next incremental run to diff against; unlike
+    # the graph version, it is not pruned and unlike the serving store, it is not refreshed
+    write_feature_store(snapshot_dir(model_path), store.wallets, X_raw, scaler, {
+        "graph_version": graph_version,
+        "model_version": model_digest(model_path),
+        "written_at": datetime.now(timezone.utc).isoformat(),
+    }, labels=y_risk)
+
+    # Serving reads these rows and this scaler instead of refitting per request; model_version
+    # (the checkpoint's content hash) ties the store to this checkpoint
+    if feature_store_dir:
+        write_feature_store(feature_store_dir, store.wallets, X_raw, scaler, {
+            "graph_version": graph_version,
+            "model_version": model_digest(model_path),
+            "written_at": datetime.now(timezone.utc).isoformat(),
+        })
+        print(f"[INFO] Feature store for {store.num_nodes} wallets written to {feature_store_dir}")
+
+    if scratch is not None:
+        del train_loader, val_loader  # shuts down loader workers still mapping the scratch files
+        scratch.cleanup()
+
+    report = {
+        "status": "trained",
+        "mode": mode,
+        "train_mode": train_mode,
+        "graph_version": graph_version,
+        "parent_graph_version": checkpoint.get("graph_version") if checkpoint is not None else None,
+        "model_path": model_path,
+        "started_at": started_at.isoformat(),
+        "config": {
+            "epochs": epochs, "hidden_dim": hidden_dim, "lr": lr, "seed": seed, "val_fraction": val_fraction,
+            "patience": patience, "batch_size": batch_size, "fanouts": list(fanouts), "loader_workers": loader_workers,
+        },
+        "num_nodes": store.num_nodes,
+        "num_edges": store.num_edges,
+        "train_nodes": int(len(train_idx)),
+        "val_nodes": int(len(val_idx)),
+        "feature_seconds": round(feature_secs, 4),
+        "total_seconds": round(time.perf_counter() - start, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "best_epoch": best_epoch,
+        "best_val_loss": best_loss if best_state is not None else None,
+        "stopped_early": len(history) < epochs and len(train_idx) > 0,
+        "epochs": history,
+    }
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, f"{started_at:%Y%m%dT%H%M%SZ}-{mode}.json")
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Run report written to {report_path}")
+    return report
+
+# =====================
+# CLI
+# =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the wallet risk GCN on the current graph artifact")
+    parser.add_argument("--graph-dir", default=GRAPH_DIR, help="graph artifact directory")
+    parser.add_argument("--model-path", default=MODEL_SAVE_PATH, help="checkpoint to write (and warm-start from)")
+    parser.add_argument("--feature-store-dir", default=FEATURE_STORE_DIR,
+                        help="directory for the serving feature store ('' = none)")
+    parser.add_argument("--report-dir", default=REPORT_DIR, help="directory for the JSON run report ('' = none)")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--hidden-dim", type=int, default=HIDDEN_DIM)
+    parser.add_argument("--lr", type=float, default=LEARNING_RATE)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--val-fraction", type=float, default=VAL_FRACTION, help="share of each label held out")
+    parser.add_argument("--patience", type=int, default=PATIENCE,
+                        help="early-stopping patience in epochs (0 = off; default 10, 5 with --incremental)")
+    parser.add_argument("--train-mode", choices=["full", "minibatch"], default=TRAIN_MODE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--fanouts", default=",".join(map(str, FANOUTS)), help="in-neighbours sampled per layer")
+    parser.add_argument("--loader-workers", type=int, default=LOADER_WORKERS)
+    parser.add_argument("--incremental", action="store_true", default=INCREMENTAL,
+                        help="fine-tune the saved model on wallets changed since its graph version")
+    args = parser.parse_args(argv)
+
+    return train(
+        graph_dir=args.graph_dir, model_path=args.model_path, report_dir=args.report_dir,
+        feature_store_dir=args.feature_store_dir, epochs=args.epochs,
+        hidden_dim=args.hidden_dim, lr=args.lr, seed=args.seed, val_fraction=args.val_fraction,
+        patience=args.patience, train_mode=args.train_mode, batch_size=args.batch_size,
+        fanouts=tuple(int(f) for f in args.fanouts.split(",")), loader_workers=args.loader_workers,
+        incremental=args.incremental,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,41 @@
 # ml_risk_calculator.py
 import os
-import pickle
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
 import torch
 import torch.nn.functional as F
 import numpy as np
-from torch_geometric.data import Data
-from sklearn.preprocessing import MinMaxScaler
+from torch_geometric.data import Data, Batch
 from torch_geometric.nn import GCNConv
+from verdict_cache import VerdictCache
+from risk_table import RiskTable, meta_path, model_digest
+from graph_snapshot import GraphSnapshot
+from features import NUM_FEATURES, min_max_scale
+from feature_store import FeatureStore, store_meta_path
 
 # =====================
 # Paths
 # =====================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-GRAPH_PICKLE = os.path.join(BASE_DIR, "..", "wallet-Graph", "wallet_graph.pkl")
-MODEL_PATH = os.path.join(BASE_DIR, "wallet_gcn_model.pth")
+GRAPH_BUILDER_DIR = os.path.join(BASE_DIR, "..", "wallet-Graph")
+GRAPH_DIR = os.environ.get("AML_GRAPH_DIR", os.path.join(GRAPH_BUILDER_DIR, "wallet_graph"))  # written by graph_builder.py
+MODEL_PATH = os.environ.get("AML_MODEL_PATH", os.path.join(BASE_DIR, "wallet_gcn_model.pth"))
+RISK_TABLE_DIR = os.environ.get("AML_RISK_TABLE_DIR", os.path.join(BASE_DIR, "risk_table"))  # written by score_graph.py
+FEATURE_STORE_DIR = os.environ.get("AML_FEATURE_STORE_DIR", os.path.join(BASE_DIR, "feature_store"))  # written by ml_model.py
 
-# =====================
-# Load Graph
-# =====================
-print("[INFO] Loading wallet graph...")
-with open(GRAPH_PICKLE, "rb") as f:
-    full_graph = pickle.load(f)
-print(f"[INFO] Wallet graph loaded: {len(full_graph.nodes())} nodes, {len(full_graph.edges())} edges")
+# The graph artifact reader lives with the builder
+sys.path.insert(0, GRAPH_BUILDER_DIR)
+from wallet_graph_store import WalletGraphStore, ShardedGraph, VersionPrunedError, current_version
+
+# Graph shards (chain x connected component) kept as CSR snapshots; others are opened on demand
+SHARD_CACHE_SIZE = int(os.environ.get("ML_SHARD_CACHE_SIZE", 8))
+
+# Per-wallet result cache
+CACHE_SIZE = int(os.environ.get("ML_CACHE_SIZE", 10_000))
+CACHE_TTL_SECS = float(os.environ.get("ML_CACHE_TTL_SECS", 300))
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print(f"[INFO] Using device: {device}")
@@ -48,104 +62,302 @@ class GCN(torch.nn.Module):
         return risk_out
 
 # =====================
-# Load Trained Model
+# Load Graph & Trained Model
+# =====================
+# Everything request-time inference needs, swapped in as one object so that a
+# reload never mixes versions and in-flight requests keep the set they started with
+Artifacts = namedtuple("Artifacts", ["graph", "model", "risk_table", "features", "version"])
+artifacts = None
+
+# Per-wallet ML results, keyed on (wallet, max_hops, artifacts.version)
+verdict_cache = VerdictCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL_SECS)
+
+# Progress of the most recent load, reported by the API's /readyz
+load_status = {"state": "not_loaded", "stage": None, "timings": {}, "error": None, "loads": 0, "loaded_at": None}
+_load_lock = threading.Lock()
+_loader_guard = threading.Lock()
+_loader_thread = None
+
+def file_version(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+def artifact_version():
+    """Identity of the graph, model, risk table and feature store on disk; changes whenever any is rewritten."""
+    table_meta = meta_path(RISK_TABLE_DIR)
+    table_version = file_version(table_meta) if os.path.exists(table_meta) else None
+    store_meta = store_meta_path(FEATURE_STORE_DIR)
+    store_version = file_version(store_meta) if os.path.exists(store_meta) else None
+    return repr((current_version(GRAPH_DIR), file_version(MODEL_PATH), table_version, store_version))
+
+def load_graph():
+    """Memory-map the whole current graph artifact (offline scoring); pages are shared with every other process mapping it."""
+    print("[INFO] Opening wallet graph artifact...")
+    store = WalletGraphStore.open_artifact(GRAPH_DIR)
+    provenance = store.manifest.get("provenance", {})
+    print(f"[INFO] Wallet graph {store.manifest['version']} mapped: {store.num_nodes} nodes, {store.num_edges} edges "
+          f"(built by {provenance.get('builder')}, {provenance.get('mode')})")
+    return store
+
+def load_shards():
+    """Map the graph's wallet -> shard index; a shard's snapshot is built the first time one of its wallets is scored."""
+    print("[INFO] Opening wallet graph shard index...")
+    graph = ShardedGraph(GRAPH_DIR, max_loaded=SHARD_CACHE_SIZE, prepare=build_snapshot)
+    print(f"[INFO] Wallet graph {graph.manifest['version']}: {graph.manifest['num_nodes']} nodes in {graph.num_shards} shards "
+          f"(keeping {SHARD_CACHE_SIZE} loaded)")
+    return graph
+
+def build_snapshot(store):
+    snapshot = GraphSnapshot.from_store(store)
+    print(f"[INFO] CSR snapshot ready: {snapshot.num_nodes} nodes, {snapshot.num_edges} edges")
+    return snapshot
+
+def load_model():
+    print("[INFO] Loading trained GCN model...")
+    checkpoint = torch.load(MODEL_PATH, map_location=device)
+    net = GCN(in_dim=NUM_FEATURES, hidden_dim=checkpoint.get("hidden_dim", 64)).to(device)
+    net.load_state_dict(checkpoint["model_state"])
+    net.eval()
+    print(f"[INFO] Model loaded successfully! (trained on graph {checkpoint.get('graph_version', 'unknown')})")
+    return net
+
+def load_risk_table(graph_version):
+    """Precomputed risk classes, if scored by the loaded model on `graph_version`."""
+    if not os.path.exists(meta_path(RISK_TABLE_DIR)):
+        print("[INFO] No precomputed risk table; all wallets scored live")
+        return None
+    table = RiskTable(RISK_TABLE_DIR)
+    # Scores from another model would disagree with live inference; ignore them
+    if table.meta.get("model_version") != model_digest(MODEL_PATH):
+        print("[WARN] Precomputed risk table was scored with a different model; ignoring it")
+        return None
+    # Classes from another graph miss the wallets' new neighbourhoods; score live until score_graph.py re-runs
+    if table.meta.get("graph_version") != graph_version:
+        print(f"[WARN] Precomputed risk table was scored on graph {table.meta.get('graph_version')}, "
+              f"not {graph_version}; ignoring it")
+        return None
+    print(f"[INFO] Precomputed risk table loaded: {len(table)} wallets (scored {table.meta.get('scored_at')})")
+    return table
+
+def load_feature_store(graph_version):
+    """Training-time scaler plus, when written for `graph_version`, the per-wallet raw feature rows."""
+    if not os.path.exists(store_meta_path(FEATURE_STORE_DIR)):
+        print("[WARN] No feature store; features are scaled per subgraph (run ml_model.py to write one)")
+        return None
+    features = FeatureStore(FEATURE_STORE_DIR)
+    # A scaler fitted for another model would feed it a different input distribution
+    if features.meta.get("model_version") != model_digest(MODEL_PATH):
+        print("[WARN] Feature store was written for a different model; features are scaled per subgraph")
+        return None
+    if features.meta.get("graph_version") != graph_version:
+        # Rows of another graph version may be stale; compute them live (score_graph.py refreshes the store)
+        print(f"[WARN] Feature store rows are from graph {features.meta.get('graph_version')}; "
+              f"computing raw features live with the stored scaler")
+        return FeatureStore(FEATURE_STORE_DIR, rows=False)
+    print(f"[INFO] Feature store loaded: {len(features)} wallets (graph {graph_version})")
+    return features
+
+def _timed_stage(name, fn, *args):
+    load_status["stage"] = name
+    start = time.perf_counter()
+    result = fn(*args)
+    load_status["timings"][name] = round(time.perf_counter() - start, 3)
+    return result
+
+def load_artifacts():
+    """
+    Load the graph, model, risk table and feature store into a new Artifacts set and swap it in.
+    The previous set keeps serving until the swap (double buffering).
+    """
+    global artifacts
+    with _load_lock:
+        load_status.update(state="loading", timings={}, error=None)
+        try:
+            version = artifact_version()
+            graph = _timed_stage("graph", load_shards)
+            net = _timed_stage("model", load_model)
+            table = _timed_stage("risk_table", load_risk_table, graph.manifest["version"])
+            features = _timed_stage("feature_store", load_feature_store, graph.manifest["version"])
+        except Exception as e:
+            load_status.update(state="failed" if artifacts is None else "ready", stage=None, error=repr(e))
+            print(f"[ERROR] Loading ML artifacts failed: {e}")
+            raise
+
+        artifacts = Artifacts(graph, net, table, features, version)
+        load_status.update(state="ready", stage=None, loads=load_status["loads"] + 1, loaded_at=time.time())
+        # Old entries can no longer be hit under the new version; free them now
+        verdict_cache.clear()
+    return artifacts
+
+def start_background_load():
+    """Load (or reload) artifacts on a daemon thread. Returns False if a load is already running."""
+    global _loader_thread
+    with _loader_guard:
+        if _loader_thread is not None and _loader_thread.is_alive():
+            return False
+
+        def run():
+            try:
+                load_artifacts()
+            except Exception:
+                pass  # reported through load_status
+
+        _loader_thread = threading.Thread(target=run, name="ml-loader", daemon=True)
+        _loader_thread.start()
+    return True
+
+def reload_if_changed():
+    """Reload the graph, model, risk table and feature store if any changed on disk. Returns True if reloaded."""
+    current = artifacts
+    if current is not None and artifact_version() == current.version:
+        return False
+    load_artifacts()
+    return True
+
+def is_ready():
+    return artifacts is not None
+
+def cache_stats():
+    return verdict_cache.stats()
+
+def shard_stats():
+    current = artifacts
+    return current.graph.stats() if current is not None else None
+
+# =====================
+# Instrumentation Hooks
 # =====================
-print("[INFO] Loading trained GCN model...")
-checkpoint = torch.load(MODEL_PATH, map_location=device)
-input_dim = 11  # Minimal numeric features
-model = GCN(in_dim=input_dim).to(device)
-model.load_state_dict(checkpoint["model_state"])
-model.eval()
-print("[INFO] Model loaded successfully!")
+# No-ops unless the API server installs metrics callbacks via set_metrics_hooks()
+def _ignore(*args):
+    pass
+
+observe_stage = _ignore      # (stage, seconds)
+observe_subgraph = _ignore   # (num_nodes, num_edges)
+
+def set_metrics_hooks(stage=None, subgraph=None):
+    global observe_stage, observe_subgraph
+    observe_stage = stage or _ignore
+    observe_subgraph = subgraph or _ignore
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
 
 # =====================
 # Helper: Build Subgraph Features
 # =====================
-def build_subgraph_features(wallet_address, G, max_hops=2):
-    if wallet_address not in G:
+def scaled_features(snapshot, nodes, src, dst, features):
+    """
+    Model input for the sorted node ids `nodes` of `snapshot`: raw rows read from the feature
+    store and scaled with the training-time scaler. Wallets the store does not hold get their
+    raw features computed over the subgraph. Without a store, the subgraph is min-max scaled
+    on its own, as before feature stores existed.
+    """
+    if features is None:
+        return min_max_scale(snapshot.node_features(nodes, src, dst))
+    positions = features.positions(snapshot.wallets[nodes])
+    found = positions >= 0
+    if found.all():
+        raw = features.raw(positions)
+    else:
+        raw = snapshot.node_features(nodes, src, dst)
+        raw[found] = features.raw(positions[found])
+    return features.scale(raw)
+
+def build_subgraph_features(wallet_address, snapshot, max_hops=2, features=None):
+    """
+    k-hop neighborhood of a wallet as a PyG Data, extracted from the CSR snapshot without copying
+    a NetworkX subgraph; node features come from the FeatureStore `features` where it has them.
+    """
+    root = snapshot.index_of(wallet_address)
+    if root is None:
         print(f"[WARN] Wallet {wallet_address} not found in graph")
         return None
 
-    nodes = set([wallet_address])
-    frontier = [wallet_address]
-    for _ in range(max_hops):
-        new_frontier = set()
-        for n in frontier:
-            neighbors = list(G.successors(n)) + list(G.predecessors(n))
-            for nb in neighbors:
-                if nb not in nodes:
-                    nodes.add(nb)
-                    new_frontier.add(nb)
-        frontier = new_frontier
-
-    subG = G.subgraph(nodes).copy()
-    node_features = []
-    node_map = {}
-
-    for idx, (node, data) in enumerate(subG.nodes(data=True)):
-        degree = subG.degree(node)
-        in_degree = subG.in_degree(node) if hasattr(subG, "in_degree") else degree
-        out_degree = subG.out_degree(node) if hasattr(subG, "out_degree") else degree
-
-        incoming_count = data.get("incoming_count", 0)
-        outgoing_count = data.get("outgoing_count", 0)
-        total_sent = data.get("total_sent", 0)
-        total_received = data.get("total_received", 0)
-        avg_fee = data.get("avg_fee", 0)
-        tx_volume = incoming_count + outgoing_count
-
-        neighbors = list(subG.successors(node)) + list(subG.predecessors(node))
-        neighbor_risks = [subG.nodes[n].get("risk_score", 0) for n in neighbors]
-        neighbor_risk_mean = np.mean(neighbor_risks) if neighbor_risks else 0
-        neighbor_risk_max = np.max(neighbor_risks) if neighbor_risks else 0
-
-        node_features.append([
-            degree, in_degree, out_degree,
-            incoming_count, outgoing_count,
-            total_sent, total_received,
-            avg_fee, tx_volume,
-            neighbor_risk_mean, neighbor_risk_max
-        ])
-        node_map[node] = idx
-
-    features = torch.tensor(MinMaxScaler().fit_transform(node_features), dtype=torch.float)
-    edges = [[node_map[u], node_map[v]] for u, v in subG.edges()]
-    edge_index = torch.tensor(edges, dtype=torch.long).t().contiguous() if edges else torch.zeros((2,0), dtype=torch.long)
-
-    return Data(x=features, edge_index=edge_index, node_map=node_map)
+    with stage_timer("build_subgraph_features"):
+        nodes = snapshot.k_hop(root, max_hops)
+        src, dst = snapshot.induced_edges(nodes)
+        with stage_timer("feature_scaling"):
+            x = scaled_features(snapshot, nodes, src, dst, features)
+        edge_index = torch.from_numpy(np.vstack([src, dst]).astype(np.int64))
+        data = Data(x=torch.tensor(x, dtype=torch.float), edge_index=edge_index)
+        data.root_index = int(np.searchsorted(nodes, root))
+    observe_subgraph(len(nodes), len(src))
+    return data
 
 # =====================
-# Evaluator Function
+# Evaluator Functions
 # =====================
-def evaluate_transaction(sender, recipient, amount, max_hops=2):
-    print(f"[INFO] Evaluating transaction: {sender} -> {recipient}, amount={amount}")
+def evaluate_wallets(wallets, max_hops=2):
+    """Score many wallets with a single batched GCN forward pass over their disjoint subgraphs."""
+    current = artifacts
+    if current is None:
+        raise RuntimeError("ML artifacts are not loaded yet")
+    graph, net, table, features, version = current
     results = {}
+    subgraphs = []
 
-    for wallet in [sender, recipient]:
-        if wallet not in full_graph:
+    for wallet in dict.fromkeys(wallets):
+        cached = verdict_cache.get((wallet, max_hops, version))
+        if cached is not None:
+            results[wallet] = dict(cached)
+            continue
+
+        # Precomputed by score_graph.py; only wallets added since then are scored live
+        precomputed = table.lookup(wallet) if table is not None else None
+        if precomputed is not None:
+            results[wallet] = {"risk_score": precomputed}
+            continue
+
+        # Only the shard holding the wallet's connected component is needed
+        try:
+            snapshot = graph.shard_for(wallet)
+        except VersionPrunedError:
+            # Newer builds pruned the version being served before a hot reload picked them up;
+            # switch to the current artifacts and score the whole call against them
+            print(f"[INFO] Graph version {graph.manifest['version']} was pruned; reloading ML artifacts")
+            if not reload_if_changed():
+                raise
+            return evaluate_wallets(wallets, max_hops)
+        if snapshot is None:
             results[wallet] = {"risk_score": 0}
             continue
 
-        data_sub = build_subgraph_features(wallet, full_graph, max_hops)
+        data_sub = build_subgraph_features(wallet, snapshot, max_hops, features)
         if data_sub is None:
             results[wallet] = {"risk_score": 0}
             continue
+        subgraphs.append((wallet, data_sub))
+
+    if not subgraphs:
+        return results
 
-        data_sub = data_sub.to(device)
-        with torch.no_grad():
-            risk_out = model(data_sub.x, data_sub.edge_index)
-            idx = data_sub.node_map[wallet]
-            risk_class = torch.argmax(risk_out[idx]).item()
+    batch = Batch.from_data_list([Data(x=d.x, edge_index=d.edge_index) for _, d in subgraphs]).to(device)
+    with torch.no_grad(), stage_timer("model_forward"):
+        risk_out = net(batch.x, batch.edge_index)
 
+    for i, (wallet, data_sub) in enumerate(subgraphs):
+        idx = batch.ptr[i].item() + data_sub.root_index
+        risk_class = torch.argmax(risk_out[idx]).item()
         results[wallet] = {"risk_score": int(risk_class)}
+        verdict_cache.put((wallet, max_hops, version), dict(results[wallet]))
         print(f"[INFO] Wallet {wallet}: Risk={risk_class}")
 
     return results
 
+def evaluate_transaction(sender, recipient, amount, max_hops=2):
+    print(f"[INFO] Evaluating transaction: {sender} -> {recipient}, amount={amount}")
+    return evaluate_wallets([sender, recipient], max_hops)
+
 # =====================
 # Example Usage
 # =====================
 if __name__ == "__main__":
+    load_artifacts()
     sender = "test1"
     recipient = "0xa07d75aacefd11b425af7181958f0f85c312f143"
     amount = 1000
@@ -0,0 +1,133 @@
+# neighbor_sampler.py
+# Neighbour-sampled mini-batches for GCN training: each batch holds a few seed nodes and a
+# bounded sample of their in-neighbourhood, so memory per step does not depend on graph size.
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+# In-neighbours sampled per node at hop 1, 2 (one hop per GCN layer)
+FANOUTS = (15, 10)
+
+# =====================
+# Pickling
+# =====================
+# Loader workers receive the sampler and features by pickle when processes are spawned (Windows,
+# macOS). A memory-mapped .npy array is sent as its path and re-mapped there, not copied.
+def portable(array):
+    if isinstance(array, np.memmap) and array.filename:
+        return ("npy", array.filename, array.shape)
+    return array
+
+def restore(value):
+    if isinstance(value, tuple) and len(value) == 3 and value[0] == "npy":
+        array = np.load(value[1], mmap_mode="r")
+        if array.shape != value[2]:
+            raise ValueError(f"{value[1]} changed shape since it was sent to a loader worker")
+        return array
+    return value
+
+class MappedState:
+    """Mixin: pickle memory-mapped attributes by path (see `portable`)."""
+
+    def __getstate__(self):
+        return {name: portable(value) for name, value in self.__dict__.items()}
+
+    def __setstate__(self, state):
+        self.__dict__.update({name: restore(value) for name, value in state.items()})
+
+# =====================
+# Sampler
+# =====================
+class NeighborSampler(MappedState):
+    """
+    Samples up to `fanouts[k]` in-neighbours of every node reached at hop k over the in-edge CSR
+    (`in_indptr`, `in_indices`), i.e. the edges a GCN layer aggregates along. All arrays may be
+    memory-mapped; only the sampled rows are read.
+    """
+
+    def __init__(self, in_indptr, in_indices, fanouts=FANOUTS):
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+        self.fanouts = tuple(fanouts)
+
+    def sample_in_edges(self, nodes, fanout, rng):
+        """(src, dst) of up to `fanout` in-edges per node; rows longer than that are drawn at random."""
+        starts = np.asarray(self.in_indptr[nodes], dtype=np.int64)
+        degrees = np.asarray(self.in_indptr[nodes + 1], dtype=np.int64) - starts
+        small = degrees <= fanout
+
+        # Short rows are taken whole
+        lengths = degrees[small]
+        positions = np.repeat(starts[small] - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        dst = np.repeat(nodes[small], lengths)
+
+        # Long rows: `fanout` draws with replacement, duplicates dropped
+        big = np.flatnonzero(~small)
+        if len(big):
+            offsets = (rng.random((len(big), fanout)) * degrees[big, None]).astype(np.int64)
+            picked = np.unique(np.column_stack([np.repeat(big, fanout), (starts[big, None] + offsets).ravel()]), axis=0)
+            positions = np.concatenate([positions, picked[:, 1]])
+            dst = np.concatenate([dst, nodes[picked[:, 0]]])
+        return np.asarray(self.in_indices[positions], dtype=np.int64), dst
+
+    def sample(self, seeds, rng):
+        """
+        Sampled computation graph of `seeds`: (nodes, src, dst) where nodes[:len(seeds)] are the
+        seeds and (src, dst) are local indices into `nodes`.
+        """
+        seeds = np.asarray(seeds, dtype=np.int64)
+        visited = np.unique(seeds)
+        frontier = visited
+        edge_src, edge_dst = [], []
+        for fanout in self.fanouts:
+            if len(frontier) == 0:
+                break
+            src, dst = self.sample_in_edges(frontier, fanout, rng)
+            edge_src.append(src)
+            edge_dst.append(dst)
+            reached = np.unique(src)
+            frontier = reached[~np.isin(reached, visited, assume_unique=True)]
+            visited = np.union1d(visited, frontier)
+
+        src = np.concatenate(edge_src) if edge_src else np.empty(0, dtype=np.int64)
+        dst = np.concatenate(edge_dst) if edge_dst else np.empty(0, dtype=np.int64)
+        # Seeds first, then the other sampled nodes in id order
+        others = np.setdiff1d(visited, seeds, assume_unique=True)
+        nodes = np.concatenate([seeds, others])
+        local = np.empty(len(visited), dtype=np.int64)
+        local[np.searchsorted(visited, nodes)] = np.arange(len(nodes))
+        return nodes, local[np.searchsorted(visited, src)], local[np.searchsorted(visited, dst)]
+
+# =====================
+# Loader
+# =====================
+class SampledBatches(MappedState):
+    """
+    collate_fn for a torch DataLoader over seed node ids: turns each batch of seeds into a PyG
+    Data with features `x` and labels `y` gathered for the sampled nodes only. `batch_size`
+    on the result is the number of seeds, which come first.
+    """
+
+    def __init__(self, sampler, x, y):
+        self.sampler = sampler
+        self.x = x
+        self.y = y
+
+    def __call__(self, seeds):
+        # torch seeds every loader worker differently; derive this batch's numpy stream from it
+        rng = np.random.default_rng(int(torch.randint(0, 2**62, ()).item()))
+        nodes, src, dst = self.sampler.sample(np.asarray(seeds, dtype=np.int64), rng)
+        return Data(
+            x=torch.from_numpy(np.asarray(self.x[nodes], dtype=np.float32)),
+            edge_index=torch.from_numpy(np.vstack([src, dst])),
+            y=torch.from_numpy(np.asarray(self.y[nodes], dtype=np.int64)),
+            batch_size=len(seeds),
+        )
+
+def sampled_loader(sampler, x, y, node_ids, batch_size=1024, shuffle=True, num_workers=0):
+    """DataLoader yielding neighbour-sampled batches seeded by `node_ids`."""
+    return torch.utils.data.DataLoader(
+        torch.from_numpy(np.asarray(node_ids, dtype=np.int64)),
+        batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+        collate_fn=SampledBatches(sampler, x, y), persistent_workers=num_workers > 0,
+    )
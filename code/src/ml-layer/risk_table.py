@@ -0,0 +1,76 @@
+# risk_table.py
+import hashlib
+import json
+import os
+import numpy as np
+
+# =====================
+# Files
+# =====================
+INDEX_FILE = "wallet_index.npy"    # sorted fixed-width wallet ids (bytes)
+SCORES_FILE = "risk_scores.npy"    # int8 risk class aligned with the index
+META_FILE = "meta.json"            # provenance: graph/model versions, counts, time
+
+# =====================
+# Precomputed per-wallet risk table
+# =====================
+def write_risk_table(directory, wallets, scores, meta):
+    """
+    Write a sorted wallet index and aligned risk classes as plain .npy files (memory-mappable).
+    `wallets` are str or, as in a graph artifact, an array of utf-8 bytes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if isinstance(wallets, np.ndarray) and wallets.dtype.kind == "S":
+        keys = np.asarray(wallets)
+    else:
+        keys = np.array([w.encode("utf-8") for w in wallets], dtype=np.bytes_)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    values = np.asarray(scores, dtype=np.int8)[order]
+
+    # Write beside the live files and swap in; meta goes last and marks the table complete
+    for name, array in ((INDEX_FILE, keys), (SCORES_FILE, values)):
+        tmp_path = os.path.join(directory, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    meta = dict(meta, num_wallets=int(len(keys)))
+    tmp_path = os.path.join(directory, META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, META_FILE))
+    return meta
+
+class RiskTable:
+    """Read-only view of a precomputed risk table; pages are shared across processes via mmap."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.index = np.load(os.path.join(directory, INDEX_FILE), mmap_mode="r")
+        self.scores = np.load(os.path.join(directory, SCORES_FILE), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.index)
+
+    def lookup(self, wallet):
+        """Risk class for `wallet`, or None if it was not in the graph at scoring time."""
+        key = wallet.encode("utf-8")
+        if len(key) > self.index.dtype.itemsize:
+            return None
+        i = int(np.searchsorted(self.index, key))
+        if i < len(self.index) and self.index[i] == key:
+            return int(self.scores[i])
+        return None
+
+def meta_path(directory):
+    return os.path.join(directory, META_FILE)
+
+def model_digest(path):
+    """SHA-256 of a model checkpoint's bytes: the same for every copy or checkout of it, unlike mtime/size."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
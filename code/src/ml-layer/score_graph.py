@@ -0,0 +1,57 @@
+# score_graph.py
+# Offline scoring: run the GCN once over the whole wallet graph and write the
+# per-wallet risk table that ml_risk_calculator reads instead of live inference.
+import time
+from datetime import datetime, timezone
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+import ml_risk_calculator as mrc
+from risk_table import write_risk_table, model_digest
+from features import fit_min_max, apply_min_max, store_features
+from feature_store import write_feature_store
+
+# =====================
+# Score Full Graph
+# =====================
+def score_graph(output_dir=mrc.RISK_TABLE_DIR, feature_store_dir=mrc.FEATURE_STORE_DIR):
+    store = mrc.load_graph()
+    graph_version = store.manifest["version"]
+    model_version = model_digest(mrc.MODEL_PATH)
+    net = mrc.load_model()
+    features = mrc.load_feature_store(graph_version)
+
+    print("[INFO] Building full-graph features...")
+    start = time.perf_counter()
+    X_raw, src, dst = store_features(store)
+    # Scale as in training; only a model without a feature store falls back to fitting here
+    scaler = (features.col_min, features.col_range) if features is not None else fit_min_max(X_raw)
+    data = Data(x=torch.tensor(apply_min_max(X_raw, *scaler), dtype=torch.float),
+                edge_index=torch.from_numpy(np.vstack([src, dst])))
+
+    print("[INFO] Running GCN over the full graph...")
+    data = data.to(mrc.device)
+    with torch.no_grad():
+        risk_classes = net(data.x, data.edge_index).argmax(dim=1).cpu().numpy()
+
+    # After a graph rebuild, refresh the serving rows for the new graph under the same scaler
+    if features is not None and features.meta.get("graph_version") != graph_version:
+        write_feature_store(feature_store_dir, store.wallets, X_raw, scaler, dict(
+            features.meta, graph_version=graph_version, written_at=datetime.now(timezone.utc).isoformat()))
+        print(f"[INFO] Feature store rows refreshed for graph {graph_version}")
+
+    meta = write_risk_table(output_dir, store.wallets, risk_classes, {
+        "graph_version": graph_version,
+        "model_version": model_version,
+        "scored_at": datetime.now(timezone.utc).isoformat(),
+        "elapsed_secs": round(time.perf_counter() - start, 3),
+    })
+    print(f"[INFO] Scored {meta['num_wallets']} wallets in {meta['elapsed_secs']}s -> {output_dir}")
+    return meta
+
+# =====================
+# Main
+# =====================
+if __name__ == "__main__":
+    score_graph()
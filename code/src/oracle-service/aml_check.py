@@ -1,51 +1,371 @@
 # aml_api_server.py
 import json
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+import time
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import execute_values
 import os
 import sys
 
-PORT = 6000
+PORT = int(os.environ.get("AML_PORT", 6000))
+
+# Concurrency: request worker threads and the DB connection pool bound
+WORKERS = int(os.environ.get("AML_WORKERS", 16))
+DB_POOL_MIN = int(os.environ.get("AML_DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.environ.get("AML_DB_POOL_MAX", 8))
+
+# Resident flagged_wallets index refresh cadence
+INDEX_REFRESH_SECS = float(os.environ.get("AML_INDEX_REFRESH_SECS", 5))
+INDEX_LAG_SECS = float(os.environ.get("AML_INDEX_LAG_SECS", 120))
+INDEX_FULL_RELOAD_SECS = float(os.environ.get("AML_INDEX_FULL_RELOAD_SECS", 3600))
+
+# Largest number of transfers accepted by /aml-check/batch
+MAX_BATCH = int(os.environ.get("AML_MAX_BATCH", 256))
+
+# Latency budget for ML scoring; past it the verdict is DB-only and scoring finishes in the background (0 = no limit)
+ML_DEADLINE_SECS = float(os.environ.get("AML_ML_DEADLINE_MS", 2000)) / 1000
+ML_WORKERS = int(os.environ.get("AML_ML_WORKERS", 4))
+# Scorings running or queued at once; past it requests skip ML and answer from the DB alone
+ML_MAX_PENDING = int(os.environ.get("AML_ML_MAX_PENDING", 2 * ML_WORKERS))
+
+# ML risk above this flags the transfer
+ML_FLAG_THRESHOLD = 5
+
+# Check the graph/model files for changes every N seconds and hot-reload them (0 = off)
+RELOAD_POLL_SECS = float(os.environ.get("AML_RELOAD_POLL_SECS", 0))
 
 # Add ML path
 ML_PATH = os.path.join(os.path.dirname(__file__), "..", "ml-layer")
 ML_PATH = os.path.abspath(ML_PATH)  # ensure absolute path
 sys.path.insert(0, ML_PATH)
 
-from ml_risk_calculator import evaluate_transaction
+from ml_risk_calculator import (
+    evaluate_transaction, evaluate_wallets, is_ready as ml_ready, load_status as ml_load_status,
+    start_background_load, reload_if_changed, cache_stats, shard_stats, set_metrics_hooks
+)
+from flagged_index import FlaggedWalletIndex
+from metrics import Registry, Counter, Gauge, Histogram, InFlight, SIZE_BUCKETS
 
 # =====================
 # DB CONFIG
 # =====================
 DB_CONFIG = {
-    "dbname": "aml_db",
-    "user": "postgres",
-    "password": "password",
-    "host": "localhost",
-    "port": 5433
+    "dbname": os.environ.get("AML_DB_NAME", "aml_db"),
+    "user": os.environ.get("AML_DB_USER", "postgres"),
+    "password": os.environ.get("AML_DB_PASSWORD", "password"),
+    "host": os.environ.get("AML_DB_HOST", "localhost"),
+    "port": int(os.environ.get("AML_DB_PORT", 5433))
 }
 
+# =====================
+# Metrics
+# =====================
+registry = Registry()
+REQUESTS = registry.register(Counter("aml_requests_total", "AML verdicts returned, by endpoint and verdict", ["endpoint", "verdict"]))
+REQUEST_SECONDS = registry.register(Histogram("aml_request_seconds", "End-to-end request latency", ["endpoint"]))
+STAGE_SECONDS = registry.register(Histogram("aml_stage_seconds", "Latency of each stage of an AML check", ["stage"]))
+SUBGRAPH_NODES = registry.register(Histogram("aml_subgraph_nodes", "Nodes in ML-scored subgraphs", buckets=SIZE_BUCKETS))
+SUBGRAPH_EDGES = registry.register(Histogram("aml_subgraph_edges", "Edges in ML-scored subgraphs", buckets=SIZE_BUCKETS))
+ML_DEADLINE_EXCEEDED = registry.register(Counter("aml_ml_deadline_exceeded_total", "ML scorings that missed the latency budget"))
+ML_SHED = registry.register(Counter("aml_ml_shed_total", "ML scorings skipped because the ML backlog was full"))
+DB_POOL_WAIT_SECONDS = registry.register(Histogram("aml_db_pool_wait_seconds", "Time spent waiting for a pooled DB connection"))
+
+workers_busy = InFlight()
+ml_workers_busy = InFlight()
+db_in_use = InFlight()
+
+def ml_cache_counts():
+    stats = cache_stats()
+    return {("hit",): stats["hits"], ("miss",): stats["misses"]}
+
+registry.register(Gauge("aml_ml_cache_lookups_total", "ML verdict cache lookups", ml_cache_counts, ["result"], kind="counter"))
+registry.register(Gauge("aml_ml_cache_hit_ratio", "ML verdict cache hit ratio", lambda: cache_stats()["hit_rate"]))
+registry.register(Gauge("aml_ml_cache_entries", "Entries in the ML verdict cache", lambda: cache_stats()["size"]))
+
+def ml_shard_counts():
+    stats = shard_stats()
+    if stats is None:
+        return {}
+    return {("loaded",): len(stats["loaded"]), ("total",): stats["shards"]}
+
+registry.register(Gauge("aml_ml_graph_shards", "Wallet graph shards loaded for ML scoring and in the artifact",
+                        ml_shard_counts, ["state"]))
+registry.register(Gauge("aml_db_pool_connections", "DB connections in use and pool bound",
+                        lambda: {("in_use",): db_in_use.value, ("max",): DB_POOL_MAX}, ["state"]))
+registry.register(Gauge("aml_workers", "Request worker threads busy and total",
+                        lambda: {("busy",): workers_busy.value, ("max",): WORKERS}, ["state"]))
+registry.register(Gauge("aml_ml_workers", "ML scoring threads busy and total",
+                        lambda: {("busy",): ml_workers_busy.value, ("max",): ML_WORKERS}, ["state"]))
+registry.register(Gauge("aml_ml_ready", "1 once the graph and model are loaded", lambda: int(ml_ready())))
+
+# ML-layer stages (build_subgraph_features, feature_scaling, model_forward) report into the same histograms
+set_metrics_hooks(
+    stage=lambda stage, secs: STAGE_SECONDS.observe(secs, stage=stage),
+    subgraph=lambda nodes, edges: (SUBGRAPH_NODES.observe(nodes), SUBGRAPH_EDGES.observe(edges))
+)
+
+# =====================
+# DB Connection Pool
+# =====================
+db_pool = None
+db_slots = None  # blocks callers instead of raising PoolError when the pool is exhausted
+
+def init_db_pool(minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX):
+    global db_pool, db_slots
+    db_pool = ThreadedConnectionPool(minconn, maxconn, **DB_CONFIG)
+    db_slots = threading.BoundedSemaphore(maxconn)
+    print(f"[AML API] DB pool ready ({minconn}-{maxconn} connections)")
+
+def close_db_pool():
+    if db_pool is not None:
+        db_pool.closeall()
+
+@contextmanager
+def db_connection():
+    wait_start = time.perf_counter()
+    with db_slots, db_in_use.track():
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - wait_start)
+        conn = db_pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            # Broken connections are discarded so the pool reconnects on next use
+            db_pool.putconn(conn, close=bool(conn.closed))
+
 # =====================
 # DB Helpers
 # =====================
+def get_wallets_from_db(wallet_ids):
+    """Resolve several wallets in one round trip. Returns {wallet_id: row} for flagged wallets only."""
+    wallet_ids = list(dict.fromkeys(w for w in wallet_ids if w))
+    if not wallet_ids:
+        return {}
+    with STAGE_SECONDS.time(stage="get_wallet_from_db"), db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT wallet_id, reason, risk_score, risk_sources FROM flagged_wallets WHERE wallet_id = ANY(%s)",
+                (wallet_ids,)
+            )
+            rows = cur.fetchall()
+    return {row[0]: {"wallet_id": row[0], "reason": row[1], "risk_score": row[2], "risk_sources": row[3]} for row in rows}
+
 def get_wallet_from_db(wallet_id: str):
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT wallet_id, reason, risk_score FROM flagged_wallets WHERE wallet_id = %s",
-        (wallet_id,)
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    if row:
-        return {"wallet_id": row[0], "reason": row[1], "risk_score": row[2]}
-    return None
+    return get_wallets_from_db([wallet_id]).get(wallet_id)
+
+# =====================
+# Flagged Wallet Index
+# =====================
+flagged_index = FlaggedWalletIndex(DB_CONFIG, refresh_interval=INDEX_REFRESH_SECS, lag_secs=INDEX_LAG_SECS,
+                                   full_reload_secs=INDEX_FULL_RELOAD_SECS)
+
+def lookup_wallets(wallet_ids):
+    # Served from memory once the index has loaded; DB until then
+    if flagged_index.ready:
+        with STAGE_SECONDS.time(stage="flagged_index_lookup"):
+            return flagged_index.get_many(wallet_ids)
+    return get_wallets_from_db(wallet_ids)
+
+# =====================
+# ML Scoring with Deadline
+# =====================
+ml_executor = ThreadPoolExecutor(max_workers=ML_WORKERS, thread_name_prefix="aml-ml")
+ml_slots = threading.BoundedSemaphore(ML_MAX_PENDING)  # held from submit until the future is done or cancelled
+
+def write_back_ml_results(future):
+    """Persist late ML results that would flag a transfer, so later lookups see them without ML."""
+    try:
+        results = future.result()
+    except Exception as e:
+        print(f"[AML API] Deferred ML scoring failed: {e}")
+        return
+
+    # Lower scores stay out of flagged_wallets (a row there short-circuits ML for the counterparty);
+    # they are served from the ML verdict cache instead
+    rows = [(w, "ML predicted score", r["risk_score"]) for w, r in results.items() if r["risk_score"] > ML_FLAG_THRESHOLD]
+    if not rows:
+        return
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO flagged_wallets (wallet_id, reason, risk_score)
+                    VALUES %s
+                    ON CONFLICT (wallet_id) DO UPDATE
+                    SET risk_score = EXCLUDED.risk_score,
+                        reason = EXCLUDED.reason,
+                        risk_sources = NULL
+                    WHERE EXCLUDED.risk_score > flagged_wallets.risk_score
+                """, rows)
+        print(f"[AML API] Wrote {len(rows)} deferred ML results to flagged_wallets")
+    except psycopg2.Error as e:
+        print(f"[AML API] Writing deferred ML results failed: {e}")
+
+def run_ml_scoring(fn, *args):
+    with ml_workers_busy.track(), STAGE_SECONDS.time(stage="ml_scoring"):
+        return fn(*args)
+
+def score_within_deadline(fn, *args):
+    """
+    Run ML scoring under the latency budget. Returns None when the ML backlog is full, when the
+    deadline passes (scoring that already started then continues in the background; queued
+    scoring is cancelled) or when scoring fails, so the caller answers from the DB alone.
+    """
+    if not ml_slots.acquire(blocking=False):
+        ML_SHED.inc()
+        return None
+    try:
+        future = ml_executor.submit(run_ml_scoring, fn, *args)
+    except RuntimeError:  # executor shut down
+        ml_slots.release()
+        return None
+    future.add_done_callback(lambda f: ml_slots.release())
+    try:
+        return future.result(timeout=ML_DEADLINE_SECS if ML_DEADLINE_SECS > 0 else None)
+    except FutureTimeoutError:
+        ML_DEADLINE_EXCEEDED.inc()
+        if not future.cancel():
+            future.add_done_callback(write_back_ml_results)
+        return None
+    except Exception as e:
+        print(f"[AML API] ML scoring failed: {e!r}")
+        return None
+
+# =====================
+# Verdict
+# =====================
+def build_verdict(sender, recipient, wallets_db, ml_results, partial=False):
+    response = {
+        "approved": True,
+        "flagged": False,
+        "reason": "",
+        "risk_score": 0,
+        "partial": False
+    }
+
+    sender_db = wallets_db.get(sender)
+    recipient_db = wallets_db.get(recipient)
+
+    # Case 1: Either wallet is in DB → return that immediately
+    if sender_db:
+        response["risk_score"] = sender_db["risk_score"]
+        response["flagged"] = sender_db["risk_score"] > 0
+        response["reason"] = sender_db["wallet_id"] + ": " + sender_db["reason"]
+        if sender_db.get("risk_sources"):
+            response["risk_sources"] = sender_db["risk_sources"]
+    elif recipient_db:
+        response["risk_score"] = recipient_db["risk_score"]
+        response["flagged"] = recipient_db["risk_score"] > 0
+        response["reason"] = recipient_db["wallet_id"] + ": " + recipient_db["reason"]
+        if recipient_db.get("risk_sources"):
+            response["risk_sources"] = recipient_db["risk_sources"]
+    elif partial:
+        # Case 2a: ML unavailable or over budget → verdict from flagged_wallets alone
+        response["partial"] = True
+    else:
+        # Case 2: Neither in DB → ML evaluation for both wallets
+        for wallet_id in (sender, recipient):
+            data_ml = ml_results.get(wallet_id, {"risk_score": 0})
+            if data_ml["risk_score"] > response["risk_score"]:
+                response["risk_score"] = data_ml["risk_score"]
+                response["flagged"] = data_ml["risk_score"] > ML_FLAG_THRESHOLD
+                response["reason"] = "ML predicted score"
+
+    # Approved is False if flagged
+    if response["flagged"]:
+        response["approved"] = False
+
+    return response
+
+def check_transaction(sender, recipient, amount):
+    # Flagged wallet lookup (sender and recipient together)
+    wallets_db = lookup_wallets([sender, recipient])
+    ml_results = None
+    partial = False
+    if sender not in wallets_db and recipient not in wallets_db:
+        if ml_ready():
+            ml_results = score_within_deadline(evaluate_transaction, sender, recipient, amount)
+        partial = ml_results is None
+    return build_verdict(sender, recipient, wallets_db, ml_results or {}, partial)
+
+def check_transactions(transactions):
+    """Verdicts for many transfers, in request order: one flagged-wallet lookup and one batched ML pass."""
+    wallets_db = lookup_wallets([w for tx in transactions for w in (tx.get("sender"), tx.get("recipient"))])
+
+    unknown = []
+    for tx in transactions:
+        sender, recipient = tx.get("sender"), tx.get("recipient")
+        if sender and recipient and sender not in wallets_db and recipient not in wallets_db:
+            unknown.extend((sender, recipient))
+    ml_results = None
+    if unknown and ml_ready():
+        ml_results = score_within_deadline(evaluate_wallets, unknown)
+    partial = bool(unknown) and ml_results is None
+    ml_results = ml_results or {}
+
+    verdicts = []
+    for tx in transactions:
+        sender, recipient = tx.get("sender"), tx.get("recipient")
+        if not sender or not recipient:
+            verdicts.append({"error": "sender and recipient required"})
+            continue
+        verdicts.append(build_verdict(sender, recipient, wallets_db, ml_results, partial))
+    return verdicts
+
+def verdict_label(verdict):
+    if "error" in verdict:
+        return "error"
+    if verdict["partial"]:
+        return "partial"
+    return "flagged" if verdict["flagged"] else "approved"
 
 # =====================
 # HTTP Request Handler
 # =====================
 class AMLRequestHandler(BaseHTTPRequestHandler):
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/healthz":
+            # Liveness: the process is up and serving
+            self.send_json(200, {"status": "ok", "uptime_secs": round(time.time() - STARTED_AT, 1)})
+        elif self.path == "/readyz":
+            # Readiness: ML artifacts and the flagged-wallet index are loaded
+            ready = ml_ready() and flagged_index.ready
+            self.send_json(200 if ready else 503, {
+                "ready": ready,
+                "ml": dict(ml_load_status),
+                "flagged_index": {
+                    "ready": flagged_index.ready,
+                    "wallets": len(flagged_index),
+                    "last_refresh": flagged_index.last_refresh
+                }
+            })
+        else:
+            self.send_response(404)
+            self.end_headers()
+
     def do_POST(self):
         if self.path == "/aml-check":
             # Read request body
@@ -59,63 +379,105 @@ class AMLRequestHandler(BaseHTTPRequestHandler):
 
             print(f"[AML API] Received request: {data}")
 
-            response = {
-                "approved": True,
-                "flagged": False,
-                "reason": "",
-                "risk_score": 0
-            }
-
             if not sender or not recipient:
-                self.send_response(400)
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "sender and recipient required"}).encode())
+                self.send_json(400, {"error": "sender and recipient required"})
                 return
 
-            # =====================
-            # DB Lookup
-            # =====================
-            sender_db = get_wallet_from_db(sender)
-            recipient_db = get_wallet_from_db(recipient)
-
-            # Case 1: Either wallet is in DB → return that immediately
-            if sender_db:
-                response["risk_score"] = sender_db["risk_score"]
-                response["flagged"] = sender_db["risk_score"] > 0
-                response["reason"] = sender_db["wallet_id"] + ": " + sender_db["reason"]
-            elif recipient_db:
-                response["risk_score"] = recipient_db["risk_score"]
-                response["flagged"] = recipient_db["risk_score"] > 0
-                response["reason"] = recipient_db["wallet_id"] + ": " + recipient_db["reason"]
+            with REQUEST_SECONDS.time(endpoint="/aml-check"):
+                verdict = check_transaction(sender, recipient, amount)
+                self.send_json(200, verdict)
+            REQUESTS.inc(endpoint="/aml-check", verdict=verdict_label(verdict))
+        elif self.path == "/aml-check/batch":
+            content_length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(content_length))
+            transactions = data.get("transactions") if isinstance(data, dict) else None
+
+            if not isinstance(transactions, list) or not all(isinstance(tx, dict) for tx in transactions):
+                self.send_json(400, {"error": "transactions must be a list of {sender, recipient, amount}"})
+                return
+            if len(transactions) > MAX_BATCH:
+                self.send_json(413, {"error": f"at most {MAX_BATCH} transactions per batch"})
+                return
+
+            print(f"[AML API] Received batch of {len(transactions)} transactions")
+            with REQUEST_SECONDS.time(endpoint="/aml-check/batch"):
+                verdicts = check_transactions(transactions)
+                self.send_json(200, {"results": verdicts})
+            for verdict in verdicts:
+                REQUESTS.inc(endpoint="/aml-check/batch", verdict=verdict_label(verdict))
+        elif self.path == "/admin/reload":
+            # Hot reload: new artifacts load beside the current ones and are swapped in when complete
+            if start_background_load():
+                self.send_json(202, {"status": "reloading"})
             else:
-                # Case 2: Neither in DB → ML evaluation for both wallets
-                ml_results = evaluate_transaction(sender, recipient, amount)
-                for wallet_id, data_ml in ml_results.items():
-                    if data_ml["risk_score"] > response["risk_score"]:
-                        response["risk_score"] = data_ml["risk_score"]
-                        response["flagged"] = data_ml["risk_score"] > 5
-                        response["reason"] = "ML predicted score"
-
-            # Approved is False if flagged
-            if response["flagged"]:
-                response["approved"] = False
-
-            # Send response
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
+                self.send_json(409, {"status": "load already in progress"})
         else:
             self.send_response(404)
             self.end_headers()
 
+# =====================
+# Threaded Server
+# =====================
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a fixed-size worker pool."""
+
+    def __init__(self, server_address, handler_class, workers=WORKERS):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aml-worker")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            with workers_busy.track():
+                self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+# =====================
+# Artifact Watcher
+# =====================
+def watch_artifacts(interval):
+    while True:
+        time.sleep(interval)
+        if not ml_ready():
+            continue
+        try:
+            if reload_if_changed():
+                print("[AML API] ML artifacts changed on disk and were reloaded")
+        except Exception as e:
+            print(f"[AML API] Artifact reload failed, keeping current version: {e}")
+
 # =====================
 # Run Server
 # =====================
+STARTED_AT = time.time()
+
 def run():
-    print(f"[AML API] Starting server on port {PORT}...")
-    server = HTTPServer(("", PORT), AMLRequestHandler)
-    server.serve_forever()
+    print(f"[AML API] Starting server on port {PORT} with {WORKERS} workers...")
+    init_db_pool()
+    flagged_index.start()
+    # Bind immediately; graph and model load in the background (DB-only verdicts until then)
+    start_background_load()
+    if RELOAD_POLL_SECS > 0:
+        threading.Thread(target=watch_artifacts, args=(RELOAD_POLL_SECS,), name="artifact-watcher", daemon=True).start()
+    server = PooledHTTPServer(("", PORT), AMLRequestHandler, workers=WORKERS)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        flagged_index.stop()
+        ml_executor.shutdown(wait=False)
+        close_db_pool()
 
 if __name__ == "__main__":
     run()
@@ -0,0 +1,168 @@
+# flagged_index.py
+import select
+import threading
+import time
+from datetime import timedelta
+import psycopg2
+import psycopg2.extensions
+
+NOTIFY_CHANNEL = "flagged_wallets_changed"
+
+# =====================
+# Resident flagged_wallets index
+# =====================
+class FlaggedWalletIndex:
+    """
+    In-memory copy of flagged_wallets kept current from the `updated_at` watermark.
+
+    A background thread LISTENs on `flagged_wallets_changed` and re-reads only the
+    rows stamped after the last watermark, and evicts wallets recorded in
+    `flagged_wallets_deleted` since then, so lookups never touch the database.
+    `lag_secs` re-reads a trailing window to catch rows from writer transactions
+    that committed after newer rows were already seen; it must exceed the longest
+    single upsert statement of the writers. Every `full_reload_secs` (and after a
+    TRUNCATE) the whole table is re-read and swapped in, dropping anything missed.
+    """
+
+    def __init__(self, db_config, refresh_interval=5.0, lag_secs=120.0, fetch_size=10_000, full_reload_secs=3600.0):
+        self.db_config = db_config
+        self.refresh_interval = refresh_interval
+        self.lag = timedelta(seconds=lag_secs)
+        self.fetch_size = fetch_size
+        self.full_reload_secs = full_reload_secs
+        self.wallets = {}
+        self.watermark = None
+        self.ready = False
+        self.last_refresh = None
+        self.last_full_load = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.wallets)
+
+    # =====================
+    # Lookups
+    # =====================
+    def get(self, wallet_id):
+        return self.wallets.get(wallet_id)
+
+    def get_many(self, wallet_ids):
+        wallets = self.wallets
+        return {w: wallets[w] for w in wallet_ids if w in wallets}
+
+    # =====================
+    # Loading
+    # =====================
+    def _apply(self, conn, wallets, where="", params=()):
+        count = 0
+        watermark = self.watermark
+        # Named cursor streams rows from the server in fetch_size chunks
+        with conn.cursor(name="flagged_index_scan") as cur:
+            cur.itersize = self.fetch_size
+            cur.execute(
+                "SELECT wallet_id, reason, risk_score, risk_sources, updated_at FROM flagged_wallets " + where,
+                params
+            )
+            for wallet_id, reason, risk_score, risk_sources, updated_at in cur:
+                wallets[wallet_id] = {"wallet_id": wallet_id, "reason": reason, "risk_score": risk_score,
+                                      "risk_sources": risk_sources}
+                if watermark is None or updated_at > watermark:
+                    watermark = updated_at
+                count += 1
+        conn.commit()
+        self.watermark = watermark
+        self.last_refresh = time.time()
+        return count
+
+    def _evict(self, conn, since):
+        # Deletions first: a wallet deleted and re-inserted since is re-read by the row scan that follows
+        with conn.cursor() as cur:
+            cur.execute("SELECT wallet_id, deleted_at FROM flagged_wallets_deleted WHERE deleted_at > %s", (since,))
+            deleted = cur.fetchall()
+        conn.commit()
+        count = 0
+        watermark = self.watermark
+        for wallet_id, deleted_at in deleted:
+            if self.wallets.pop(wallet_id, None) is not None:
+                count += 1
+            if deleted_at > watermark:
+                watermark = deleted_at
+        self.watermark = watermark
+        return count
+
+    def load(self, conn):
+        """Read the whole table into a new dict and swap it in, so rows deleted meanwhile are dropped."""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            wallets = {}
+            self.watermark = None
+            count = self._apply(conn, wallets)
+            self.wallets = wallets
+            self.last_full_load = time.time()
+            self.ready = True
+        print(f"[AML INDEX] Loaded {count} flagged wallets in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return count
+
+    def refresh(self, conn):
+        if self.watermark is None or time.time() - self.last_full_load >= self.full_reload_secs:
+            return self.load(conn)
+        with self._refresh_lock:
+            since = self.watermark - self.lag
+            evicted = self._evict(conn, since)
+            return evicted + self._apply(conn, self.wallets, "WHERE updated_at > %s", (since,))
+
+    # =====================
+    # Background refresh
+    # =====================
+    def _connect(self):
+        conn = psycopg2.connect(**self.db_config)
+        listen = psycopg2.connect(**self.db_config)
+        listen.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with listen.cursor() as cur:
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+        return conn, listen
+
+    def _run(self):
+        conn = listen = None
+        while not self._stop.is_set():
+            try:
+                if conn is None:
+                    conn, listen = self._connect()
+                    if not self.ready:
+                        self.load(conn)
+                    else:
+                        self.refresh(conn)
+
+                # Wake on NOTIFY or fall back to polling the watermark
+                if select.select([listen], [], [], self.refresh_interval) != ([], [], []):
+                    listen.poll()
+                    truncated = any(n.payload == "TRUNCATE" for n in listen.notifies)
+                    listen.notifies.clear()
+                    if truncated:
+                        self.load(conn)
+                        continue
+                changed = self.refresh(conn)
+                if changed:
+                    print(f"[AML INDEX] Refreshed {changed} rows ({len(self.wallets)} flagged wallets)")
+            except psycopg2.Error as e:
+                print(f"[AML INDEX] Refresh failed, reconnecting: {e}")
+                for c in (conn, listen):
+                    if c is not None and not c.closed:
+                        c.close()
+                conn = listen = None
+                self._stop.wait(self.refresh_interval)
+
+        for c in (conn, listen):
+            if c is not None and not c.closed:
+                c.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="flagged-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.refresh_interval + 1)
@@ -16,7 +16,9 @@ const RPC_ENDPOINT = process.env.RPC_URL!;
 const CONTRACT_ADDRESS = process.env.CONTRACT_ADDRESS!;
 const AML_API = process.env.AML_API!;
 const ORACLE_PRIVKEY = process.env.ORACLE_PRIVKEY!;
+const AML_BATCH_API = process.env.AML_BATCH_API || `${AML_API}/batch`;
 const POLL_INTERVAL_MS = 10_000; // 10 seconds
+const MAX_BATCH = Number(process.env.AML_MAX_BATCH || 64); // pending txs checked per round trip
 const PREFIX = "wasm"; // adjust for your chain prefix
 const gasPrice = GasPrice.fromString("0.025ustake"); 
 const defaultFee = calculateFee(1, gasPrice); // optional fixed fee
@@ -63,8 +65,50 @@ async function performAmlCheck(tx: PendingTx): Promise<OracleResponseParams> {
   }
 }
 
-// ==== PROCESS NEXT PENDING TX ONLY ====
-async function processNextTransaction(oracleClient: NewOracleClient) {
+// ==== BATCH AML CHECK ====
+async function performAmlCheckBatch(txs: PendingTx[]): Promise<OracleResponseParams[]> {
+  try {
+    const response = await axios.post(AML_BATCH_API, {
+      transactions: txs.map((tx) => ({
+        sender: tx.sender,
+        recipient: tx.recipient,
+        amount: tx.amount.amount,
+        denom: tx.amount.denom,
+      })),
+    });
+
+    const results: any[] = response.data.results;
+    console.info(`AML batch API call finished (${results.length} txs)`);
+    return results.map((data) =>
+      data.error
+        ? { request_id: 0, approved: false, flagged: true, reason: "AML API error", risk_score: 100 }
+        : {
+            request_id: 0, // will set later
+            approved: data.approved,
+            flagged: data.flagged,
+            reason: data.reason || "",
+            risk_score: data.risk_score || 0,
+          }
+    );
+  } catch (err) {
+    console.error("AML batch API call failed:", err);
+    return txs.map(() => ({
+      request_id: 0,
+      approved: false,
+      flagged: true,
+      reason: "AML API error",
+      risk_score: 100,
+    }));
+  }
+}
+
+// ==== DRAIN PENDING TXS IN BATCHES ====
+let draining = false;
+
+async function processPendingTransactions(oracleClient: NewOracleClient) {
+  // A drain can outlast the poll interval; never run two at once
+  if (draining) return;
+  draining = true;
   try {
     const nextIdRaw = await oracleClient.getNextId();
     console.log("getNextId response:", nextIdRaw);
@@ -74,25 +118,38 @@ async function processNextTransaction(oracleClient: NewOracleClient) {
       return;
     }
 
-    const tx = await oracleClient.getPendingTx(nextIdRaw);
-    console.log(`getPendingTx(${nextIdRaw}) response:`, tx);
+    // Collect consecutive pending txs starting at next id
+    const ids: number[] = [];
+    const txs: PendingTx[] = [];
+    for (let id = nextIdRaw; txs.length < MAX_BATCH; id++) {
+      const tx = await oracleClient.getPendingTx(id);
+      if (!tx) break;
+      ids.push(id);
+      txs.push(tx);
+    }
 
-    if (!tx) {
+    if (txs.length === 0) {
       console.log(`No transaction found for id=${nextIdRaw}`);
       return;
     }
 
-    console.log(`Processing pending tx id=${nextIdRaw} sender=${tx.sender} recipient=${tx.recipient}`);
+    console.log(`Processing ${txs.length} pending txs (ids ${ids[0]}..${ids[ids.length - 1]})`);
 
-    // Run AML check
-    const amlResult = await performAmlCheck(tx);
-    amlResult.request_id = nextIdRaw;
-    console.log(amlResult)
-    // Send OracleResponse
-    const res: ExecuteResult = await oracleClient.executeOracleResponse(amlResult);
-    console.log(`OracleResponse sent for tx id=${nextIdRaw}:`, res.transactionHash);
+    // Run AML checks in one round trip
+    const amlResults = txs.length === 1 ? [await performAmlCheck(txs[0])] : await performAmlCheckBatch(txs);
+
+    // Send OracleResponses in id order so the contract advances next id
+    for (let i = 0; i < ids.length; i++) {
+      const amlResult = amlResults[i];
+      amlResult.request_id = ids[i];
+      console.log(amlResult);
+      const res: ExecuteResult = await oracleClient.executeOracleResponse(amlResult);
+      console.log(`OracleResponse sent for tx id=${ids[i]}:`, res.transactionHash);
+    }
   } catch (err) {
-    console.error("Error processing next transaction:", err);
+    console.error("Error processing pending transactions:", err);
+  } finally {
+    draining = false;
   }
 }
 
@@ -102,7 +159,7 @@ async function startPolling() {
   console.log("Oracle client initialized. Starting polling...");
  
   setInterval(() => {
-     processNextTransaction(oracleClient);
+     processPendingTransactions(oracleClient);
   }, POLL_INTERVAL_MS);
 }
 
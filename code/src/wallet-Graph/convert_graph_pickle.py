@@ -0,0 +1,44 @@
+# convert_graph_pickle.py
+# One-off converter from a legacy wallet_graph.pkl (NetworkX DiGraph) to the versioned
+# graph artifact directory read by the ML layer and MCP server.
+import argparse
+import hashlib
+import os
+import pickle
+
+from wallet_graph_store import WalletGraphStore
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def convert(pickle_path, artifact_dir):
+    print(f"[INFO] Loading {pickle_path}...")
+    with open(pickle_path, "rb") as f:
+        G = pickle.load(f)
+    print(f"[INFO] Converting {G.number_of_nodes()} wallets, {G.number_of_edges()} edges...")
+    store = WalletGraphStore.from_networkx(G)
+    manifest = store.save_artifact(artifact_dir, {
+        # No block watermarks are known for a pickle; the next --incremental run reloads every block
+        "watermarks": {},
+        "provenance": {
+            "builder": "convert_graph_pickle.py",
+            "mode": "converted",
+            "source_pickle": os.path.abspath(pickle_path),
+            "source_sha256": file_sha256(pickle_path),
+        },
+    })
+    print(f"[INFO] Graph artifact {manifest['version']} written to {artifact_dir}")
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert wallet_graph.pkl to a versioned graph artifact")
+    parser.add_argument("pickle_path", nargs="?", default=os.path.join(BASE_DIR, "wallet_graph.pkl"))
+    parser.add_argument("artifact_dir", nargs="?", default=os.path.join(BASE_DIR, "wallet_graph"))
+    args = parser.parse_args()
+    convert(args.pickle_path, args.artifact_dir)
@@ -1,12 +1,19 @@
 import psycopg2
-import networkx as nx
 from pyvis.network import Network
 import os
+import argparse
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
-from tqdm import tqdm
-import pickle
 import math
-from psycopg2.extras import execute_values
+import heapq
+import numpy as np
+
+from risk_propagation import (MAX_HOPS, NearestSources, undirected_adjacency, propagate_risk, neighborhood,
+                              propagate_risk_to)
+from wallet_graph_store import GraphStoreBuilder, WalletGraphStore, PROXIMITY_REASON, current_version, merge_stores
 
 DB_CONFIG = {
     "dbname": "aml_db",
@@ -18,139 +25,408 @@ DB_CONFIG = {
 
 MAX_RISK = 10
 
+# Rows fetched per round trip when streaming transactions from Postgres
+CHUNK_SIZE = int(os.environ.get("GRAPH_CHUNK_SIZE", 50_000))
+
+# Versioned graph artifact read by the ML layer and MCP server; its manifest also holds the
+# per-chain block watermarks used by incremental updates
+GRAPH_ARTIFACT_DIR = os.environ.get(
+    "GRAPH_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "wallet_graph"))
+# Target wallets per artifact shard (chain x connected component) loaded by the serving layers; 0 = no shards
+SHARD_MAX_NODES = int(os.environ.get("GRAPH_SHARD_MAX_NODES", 1_000_000))
+
+# Worker processes loading block-range partitions concurrently (1 = load in this process)
+WORKERS = int(os.environ.get("GRAPH_WORKERS", os.cpu_count() or 1))
+# Block-range partitions per chain; defaults to one per worker
+PARTITIONS = int(os.environ.get("GRAPH_PARTITIONS", WORKERS))
+
+# Level-of-detail visualization budgets: the HTML never holds more nodes / edges than this
+VIS_MAX_NODES = int(os.environ.get("GRAPH_VIS_MAX_NODES", 500))
+VIS_MAX_EDGES = int(os.environ.get("GRAPH_VIS_MAX_EDGES", 2_000))
+# Neighbours with a single counterparty edge and risk below this are folded into cluster nodes
+VIS_LEAF_RISK = float(os.environ.get("GRAPH_VIS_LEAF_RISK", 1))
+
+# Transactions per chain in a block range (lo, hi]; partitions start at the chain's watermark
+TX_QUERIES = [
+    ("BTC", """
+        SELECT t.hash, t.input_addresses, o.addresses, o.value, t.block_number, t.block_timestamp, t.fee
+        FROM bitcoin_transactions t
+        JOIN bitcoin_outputs o ON t.hash = o.transaction_hash
+        WHERE t.input_addresses IS NOT NULL AND o.addresses IS NOT NULL
+          AND t.block_number > %s AND t.block_number <= %s
+        ORDER BY t.block_timestamp ASC;
+    """),
+    ("ETH", """
+        SELECT hash, fromm_address, to_address, value, block_number, block_timestamp, gas_price
+        FROM eth_transactions
+        WHERE fromm_address IS NOT NULL AND to_address IS NOT NULL
+          AND block_number > %s AND block_number <= %s
+        ORDER BY block_timestamp ASC;
+    """),
+    ("ERC20", """
+        SELECT transaction_hash, from_address, to_address, value, block_number, block_timestamp
+        FROM eth_token_transfers
+        WHERE from_address IS NOT NULL AND to_address IS NOT NULL
+          AND block_number > %s AND block_number <= %s
+        ORDER BY block_timestamp ASC;
+    """)
+]
+BLOCK_TABLES = {"BTC": "bitcoin_transactions", "ETH": "eth_transactions", "ERC20": "eth_token_transfers"}
+
+# ------------------------------
+# Shared steps
+# ------------------------------
+def load_flagged_wallets(cur):
+    """
+    Current flagged_wallets rows as {wallet: {"reason", "risk_score", "risk_sources"}}, plus the subset flagged
+    upstream (sanctions lists, heuristics, ...). Rows this builder wrote with PROXIMITY_REASON
+    are derived from the graph and recomputed on every run, not used as propagation sources.
+    """
+    cur.execute("SELECT wallet_id, reason, risk_score, risk_sources FROM flagged_wallets;")
+    flagged_wallets_db = {w: {"reason": r, "risk_score": s, "risk_sources": src} for w, r, s, src in cur.fetchall()}
+    seeds = {w: info for w, info in flagged_wallets_db.items() if info["reason"] != PROXIMITY_REASON}
+    print(f"[INFO] Loaded {len(flagged_wallets_db)} flagged wallets from DB ({len(seeds)} propagation sources)")
+    return flagged_wallets_db, seeds
+
+def add_rows(builder, blockchain, rows):
+    """Add one fetched chunk of `blockchain` rows to `builder`; returns the highest block number in it."""
+    if blockchain == "ERC20":
+        rows = [row + (None,) for row in rows]
+    rows = [row for row in rows if row[1] and row[2]]
+    if not rows:
+        return -1
+    _, senders, recipients, values, blocks, timestamps, fees = zip(*rows)
+    builder.add_chunk(
+        token_type=blockchain if blockchain != "ETH" else "ETH_native",
+        blockchain=blockchain if blockchain != "ERC20" else "ETH",
+        senders=senders, recipients=recipients, values=values,
+        timestamps=timestamps, blocks=blocks, fees=fees
+    )
+    return max((b for b in blocks if b is not None), default=-1)
+
+def plan_partitions(cur, watermarks, partitions):
+    """Split each chain's blocks above its watermark into `partitions` ranges (lo, hi], in TX_QUERIES order."""
+    tasks = []
+    for blockchain, _ in TX_QUERIES:
+        watermark = watermarks.get(blockchain, -1)
+        cur.execute(f"SELECT min(block_number), max(block_number) FROM {BLOCK_TABLES[blockchain]} "
+                    f"WHERE block_number > %s;", (watermark,))
+        first, last = cur.fetchone()
+        if first is None:
+            continue
+        lo = first - 1
+        step = max(1, -(-(last - lo) // partitions))
+        while lo < last:
+            tasks.append((blockchain, lo, min(lo + step, last)))
+            lo += step
+    return tasks
+
+def load_partition(task, chunk_size=CHUNK_SIZE):
+    """
+    Worker: stream one (blockchain, lo, hi) block range through a server-side cursor into a
+    partial graph. Returns (task, partial WalletGraphStore, highest block seen, rows read).
+    """
+    blockchain, lo, hi = task
+    query = dict(TX_QUERIES)[blockchain]
+    builder = GraphStoreBuilder()
+    max_block, total = -1, 0
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        with conn.cursor(name=f"graph_builder_{blockchain.lower()}_{lo}") as stream:
+            stream.itersize = chunk_size
+            stream.execute(query, (lo, hi))
+            while True:
+                rows = stream.fetchmany(chunk_size)
+                if not rows:
+                    break
+                max_block = max(max_block, add_rows(builder, blockchain, rows))
+                total += len(rows)
+                print(f"[INFO] {blockchain} blocks ({lo}, {hi}]: processed {total} transactions "
+                      f"({len(builder.ids)} wallets)")
+        conn.commit()  # close the named cursor's transaction
+    finally:
+        conn.close()
+    print(f"[INFO] {blockchain} blocks ({lo}, {hi}]: {total} transactions, {len(builder.ids)} wallets")
+    return task, builder.finish(), max_block, total
+
+def ingest_transactions(cur, watermarks, chunk_size=CHUNK_SIZE, workers=WORKERS, partitions=PARTITIONS):
+    """
+    Load every chain's rows above its watermark as block-range partitions, `workers` at a time
+    in a process pool. Returns (partial stores in task order, advanced watermarks); merging
+    them in that order makes the result independent of which worker finished first.
+    """
+    watermarks = {blockchain: watermarks.get(blockchain, -1) for blockchain, _ in TX_QUERIES}
+    tasks = plan_partitions(cur, watermarks, max(1, partitions))
+    print(f"[INFO] Loading {len(tasks)} block-range partitions with {workers} worker(s)")
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(load_partition, tasks, [chunk_size] * len(tasks)))
+    else:
+        results = [load_partition(task, chunk_size) for task in tasks]
+
+    partials = []
+    totals = defaultdict(int)
+    for (blockchain, _, _), partial, max_block, total in results:
+        partials.append(partial)
+        watermarks[blockchain] = max(watermarks[blockchain], max_block)
+        totals[blockchain] += total
+    for blockchain, _ in TX_QUERIES:
+        print(f"[INFO] Loaded {totals[blockchain]} {blockchain} transactions (up to block {watermarks[blockchain]})")
+    return partials, watermarks
+
+def apply_risk(store, ids, risk, seeds, nearest):
+    """
+    Write propagated scores for node ids `ids`; non-source wallets reaching risk 1 are flagged by
+    proximity, and the closest flagged sources in `nearest` are kept as their explanation.
+    """
+    store.nodes["risk_score"][ids] = np.minimum(risk, MAX_RISK)
+    proximity = ids[(risk >= 1) & ~seeds[ids]]
+    store.flagged[proximity] = True
+    store.set_reason(proximity, PROXIMITY_REASON)
+    sources = nearest.sources[ids]
+    sources[seeds[ids]] = -1  # flagged upstream: explained by their own reason
+    store.set_risk_sources(ids, sources, nearest.hops[ids])
+
+def db_risk(risk):
+    """Propagated risk as stored in the INT risk_score column (numeric cast: round half away from zero)."""
+    return int(math.floor(risk + 0.5))
+
+def flagged_delta(store, ids, current):
+    """
+    Rows among node ids `ids` whose upsert would change flagged_wallets given its `current`
+    contents: new wallets, a different reason or closest sources, or a higher score (scores only
+    ever go up). Returns (rows, inserts, updates); risk_sources is JSON text or None.
+    """
+    rows, inserts, updates = [], 0, 0
+    for i in ids:
+        if not store.flagged[i]:
+            continue
+        wallet, reason, risk = store.wallet(i), store.reason(i), db_risk(store.nodes["risk_score"][i])
+        sources = store.risk_sources_of(i) or None
+        existing = current.get(wallet)
+        if existing is None:
+            inserts += 1
+        elif (existing["reason"] != reason or existing["risk_score"] is None or risk > existing["risk_score"]
+              or existing.get("risk_sources") != sources):
+            updates += 1
+        else:
+            continue
+        rows.append((wallet, reason, risk, json.dumps(sources) if sources else None))
+    return rows, inserts, updates
+
+def upsert_flagged(conn, cur, store, ids, current):
+    """
+    Write only the changed flagged wallets among node ids `ids`: COPY them into a temporary
+    staging table and merge with one INSERT ... ON CONFLICT. Unchanged rows are not rewritten,
+    so the table does not bloat and the API's flagged-wallet index sees only real changes.
+    """
+    rows, inserts, updates = flagged_delta(store, ids, current)
+    print(f"[INFO] flagged_wallets delta: {len(rows)} of {int(store.flagged[ids].sum())} flagged wallets "
+          f"changed ({inserts} new, {updates} updated)")
+    if not rows:
+        return 0
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.execute("""
+        CREATE TEMP TABLE flagged_wallets_staging (
+            wallet_id TEXT PRIMARY KEY,
+            reason TEXT,
+            risk_score INT,
+            risk_sources JSONB
+        ) ON COMMIT DROP;
+    """)
+    cur.copy_expert("COPY flagged_wallets_staging (wallet_id, reason, risk_score, risk_sources) "
+                    "FROM STDIN WITH (FORMAT csv)", buffer)
+    # The WHERE clause re-checks the delta against the live row, in case it changed since it was read
+    cur.execute("""
+        INSERT INTO flagged_wallets (wallet_id, reason, risk_score, risk_sources)
+        SELECT wallet_id, reason, risk_score, risk_sources FROM flagged_wallets_staging
+        ON CONFLICT (wallet_id) DO UPDATE
+        SET reason = EXCLUDED.reason,
+            risk_score = GREATEST(flagged_wallets.risk_score, EXCLUDED.risk_score),
+            risk_sources = EXCLUDED.risk_sources
+        WHERE flagged_wallets.reason IS DISTINCT FROM EXCLUDED.reason
+           OR flagged_wallets.risk_score IS NULL
+           OR flagged_wallets.risk_score < EXCLUDED.risk_score
+           OR flagged_wallets.risk_sources IS DISTINCT FROM EXCLUDED.risk_sources;
+    """)
+    changed = cur.rowcount
+    conn.commit()
+    print(f"[INFO] flagged_wallets: {changed} rows changed")
+    return changed
+
 # ------------------------------
 # Build full wallet graph and propagate risk efficiently
 # ------------------------------
-def build_wallet_graph():
+def build_wallet_graph(chunk_size=CHUNK_SIZE):
+    """
+    Stream all transfers into a WalletGraphStore, propagate risk and upsert flagged wallets.
+    Returns (store, watermarks) where watermarks is the last block_number loaded per chain.
+    """
     conn = psycopg2.connect(**DB_CONFIG)
     cur = conn.cursor()
-    G = nx.DiGraph()
-
-    # Load flagged wallets from DB
-    cur.execute("SELECT wallet_id, reason, risk_score FROM flagged_wallets;")
-    flagged_wallets_db = {w: {"reason": r, "risk_score": s} for w, r, s in cur.fetchall()}
-    print(f"[INFO] Loaded {len(flagged_wallets_db)} flagged wallets from DB")
-
-    # Helper to add nodes
-    def add_node(addr, blockchain):
-        if not G.has_node(addr):
-            is_flagged = addr in flagged_wallets_db
-            G.add_node(
-                addr,
-                color="white",
-                borderWidth=2,
-                flagged=is_flagged,
-                flagged_reason=flagged_wallets_db[addr]["reason"] if is_flagged else None,
-                risk_score=flagged_wallets_db[addr]["risk_score"] if is_flagged else 0,
-                blockchain=blockchain,
-                incoming_count=0,
-                outgoing_count=0,
-                total_received=0,
-                total_sent=0
-            )
-
-    # Load transactions (BTC, ETH, ERC20)
-    tx_queries = [
-        ("BTC", """
-            SELECT t.hash, t.input_addresses, o.addresses, o.value, t.block_number, t.block_timestamp, t.fee
-            FROM bitcoin_transactions t
-            JOIN bitcoin_outputs o ON t.hash = o.transaction_hash
-            WHERE t.input_addresses IS NOT NULL AND o.addresses IS NOT NULL
-            ORDER BY t.block_timestamp ASC;
-        """),
-        ("ETH", """
-            SELECT hash, fromm_address, to_address, value, block_number, block_timestamp, gas_price
-            FROM eth_transactions
-            WHERE fromm_address IS NOT NULL AND to_address IS NOT NULL
-            ORDER BY block_timestamp ASC;
-        """),
-        ("ERC20", """
-            SELECT transaction_hash, from_address, to_address, value, block_number, block_timestamp
-            FROM eth_token_transfers
-            WHERE from_address IS NOT NULL AND to_address IS NOT NULL
-            ORDER BY block_timestamp ASC;
-        """)
-    ]
-
-    for blockchain, query in tx_queries:
-        cur.execute(query)
-        rows = cur.fetchall()
-        print(f"[INFO] Loaded {len(rows)} {blockchain} transactions")
-        for row in tqdm(rows, desc=f"Processing {blockchain} txs"):
-            if blockchain == "BTC":
-                tx_hash, from_addr, to_addr, value, block_number, ts, fee = row
-            elif blockchain == "ETH":
-                tx_hash, from_addr, to_addr, value, block_number, ts, fee = row
-            else:
-                tx_hash, from_addr, to_addr, value, block_number, ts = row
-                fee = None
-
-            if not from_addr or not to_addr:
-                continue
-
-            add_node(from_addr, blockchain if blockchain != "ERC20" else "ETH")
-            add_node(to_addr, blockchain if blockchain != "ERC20" else "ETH")
-
-            # Add edge
-            G.add_edge(from_addr, to_addr,
-                       tx_hash=tx_hash,
-                       value=float(value or 0),
-                       timestamp=str(ts),
-                       token_type=blockchain if blockchain != "ETH" else "ETH_native",
-                       block_number=block_number,
-                       fee=float(fee or 0) if fee else None)
-
-            # Update stats
-            G.nodes[from_addr]["outgoing_count"] += 1
-            G.nodes[from_addr]["total_sent"] += float(value or 0)
-            G.nodes[to_addr]["incoming_count"] += 1
-            G.nodes[to_addr]["total_received"] += float(value or 0)
+
+    flagged_wallets_db, seeds_db = load_flagged_wallets(cur)
+    partials, watermarks = ingest_transactions(cur, {}, chunk_size)
+
+    store = merge_stores(partials)
+    store.apply_flags(seeds_db)
+    print(f"[INFO] Graph store: {store.num_nodes} wallets, {store.num_edges} distinct edges, "
+          f"{store.nbytes() / 1e6:.1f} MB of arrays")
 
     # ------------------------------
-    # Risk propagation (efficient BFS)
+    # Risk propagation (multi-source sparse BFS)
     # ------------------------------
     print("[INFO] Propagating risk scores...")
-    risk_scores = {n: G.nodes[n]["risk_score"] for n in G.nodes}
-    flagged_nodes = [n for n, d in G.nodes(data=True) if d.get("flagged")]
-    for node in flagged_nodes:
-        risk_scores[node] = MAX_RISK
-
-    # Multi-hop BFS: 1,2,3 hops, decaying risk
-    for flagged in tqdm(flagged_nodes, desc="Propagating from flagged wallets"):
-        lengths = nx.single_source_shortest_path_length(G.to_undirected(), flagged, cutoff=3)
-        for node, dist in lengths.items():
-            if node in flagged_nodes:
-                continue
-            # Combine risk: decay with hop, + number of flagged sources
-            incremental_risk = MAX_RISK / dist
-            risk_scores[node] = min(MAX_RISK, risk_scores.get(node,0) + incremental_risk)
-
-    # Update graph
-    for node, risk in risk_scores.items():
-        G.nodes[node]["risk_score"] = min(risk, MAX_RISK)
-        if risk >= 1:
-            G.nodes[node]["flagged"] = True
-            G.nodes[node]["flagged_reason"] = "Proximity to risky wallets"
+    adjacency = undirected_adjacency(store.num_nodes, store.edge_sources(), store.indices)  # built once, not per flagged wallet
+    seeds = store.seeds()
+
+    # 1/2/3-hop decayed contributions: MAX_RISK / distance per flagged wallet, capped at MAX_RISK;
+    # the closest contributing flagged wallets are collected in the same pass
+    nearest = NearestSources(store.num_nodes)
+    risk = propagate_risk(adjacency, store.nodes["risk_score"], np.flatnonzero(seeds), max_risk=MAX_RISK, nearest=nearest)
+    apply_risk(store, np.arange(store.num_nodes), risk, seeds, nearest)
 
     #------------------------------
     # Batch update DB
     #------------------------------
-    flagged_to_upsert = [(n, d["flagged_reason"], d["risk_score"])
-                         for n,d in G.nodes(data=True) if d["flagged"]]
-    if flagged_to_upsert:
-        execute_values(cur, """
-            INSERT INTO flagged_wallets (wallet_id, reason, risk_score)
-            VALUES %s
-            ON CONFLICT (wallet_id) DO UPDATE
-            SET reason = EXCLUDED.reason,
-                risk_score = GREATEST(flagged_wallets.risk_score, EXCLUDED.risk_score)
-        """, flagged_to_upsert)
-        conn.commit()
+    upsert_flagged(conn, cur, store, np.flatnonzero(store.flagged), flagged_wallets_db)
 
     cur.close()
     conn.close()
     print("[INFO] Graph building and risk propagation completed")
-    return G
+    return store, watermarks
+
+# ------------------------------
+# Incremental update of a saved graph
+# ------------------------------
+def update_wallet_graph(artifact_dir=GRAPH_ARTIFACT_DIR, chunk_size=CHUNK_SIZE):
+    """
+    Extend the current graph artifact under `artifact_dir` with transfers above its per-chain watermarks and
+    re-propagate risk only where it can change:
+      * within MAX_HOPS - 1 hops of wallets on a new sender -> recipient pair (a shortest
+        path through a new edge reaches at most that far past it), and
+      * within MAX_HOPS hops of wallets newly flagged upstream.
+    Edges and flags are only ever added here; run a full build to drop removed flags.
+    Returns (store, watermarks).
+    """
+    store = WalletGraphStore.open_artifact(artifact_dir)
+    meta = store.manifest
+    print(f"[INFO] Loaded graph artifact {meta['version']}: {store.num_nodes} wallets, {store.num_edges} edges")
+    old_seeds = store.seeds()
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+
+    flagged_wallets_db, seeds_db = load_flagged_wallets(cur)
+    new_seed_wallets = [w for w in seeds_db if store.index_of(w) < 0 or not old_seeds[store.index_of(w)]]
+
+    partials, watermarks = ingest_transactions(cur, meta.get("watermarks", {}), chunk_size)
+    base = store
+    store = merge_stores([base] + partials)
+    store.apply_flags(seeds_db)
+    seeds = store.seeds()
+    new_pair_nodes = store.new_pair_nodes(base)
+    new_seed_ids = np.array([i for i in map(store.index_of, new_seed_wallets) if i >= 0], dtype=np.int64)
+    print(f"[INFO] {len(new_pair_nodes)} wallets on new edges, {len(new_seed_ids)} newly flagged wallets")
+
+    adjacency = undirected_adjacency(store.num_nodes, store.edge_sources(), store.indices)
+    affected = np.union1d(neighborhood(adjacency, new_pair_nodes, MAX_HOPS - 1),
+                          neighborhood(adjacency, new_seed_ids, MAX_HOPS))
+    print(f"[INFO] Re-propagating risk for {len(affected)} of {store.num_nodes} wallets")
+    if len(affected):
+        nearest = NearestSources(store.num_nodes)
+        risk = propagate_risk_to(adjacency, affected, seeds, max_risk=MAX_RISK, nearest=nearest)
+        apply_risk(store, affected, risk, seeds, nearest)
+        upsert_flagged(conn, cur, store, affected, flagged_wallets_db)
+
+    cur.close()
+    conn.close()
+    print("[INFO] Incremental graph update completed")
+    return store, watermarks
+
+# ------------------------------
+# Visualization helpers
+# ------------------------------
+# Click handler showing a node's or edge's `info` dict in a floating box
+INFO_BOX_JS = """<script type="text/javascript">
+var network = window.network;
+var container = document.getElementById('mynetwork');
+var infoBox = document.createElement('div');
+infoBox.style.position = 'absolute';
+infoBox.style.background = 'white';
+infoBox.style.border = '1px solid black';
+infoBox.style.padding = '8px';
+infoBox.style.display = 'none';
+infoBox.style.zIndex = 10;
+document.body.appendChild(infoBox);
+network.on('click', function(params) {
+    if(params.nodes.length > 0){
+        var nodeId = params.nodes[0];
+        var nodeData = network.body.data.nodes.get(nodeId);
+        var info = nodeData.info;
+        infoBox.innerHTML = '';
+        for(var key in info){
+            infoBox.innerHTML += '<b>' + key + ':</b> ' + info[key] + '<br>';
+        }
+        infoBox.style.display = 'block';
+        infoBox.style.left = params.pointer.DOM.x + 'px';
+        infoBox.style.top = params.pointer.DOM.y + 'px';
+    } else if(params.edges.length > 0){
+        var edgeId = params.edges[0];
+        var edgeData = network.body.data.edges.get(edgeId);
+        var info = edgeData.info;
+        infoBox.innerHTML = '';
+        for(var key in info){
+            infoBox.innerHTML += '<b>' + key + ':</b> ' + info[key] + '<br>';
+        }
+        infoBox.style.display = 'block';
+        infoBox.style.left = params.pointer.DOM.x + 'px';
+        infoBox.style.top = params.pointer.DOM.y + 'px';
+    } else {
+        infoBox.style.display = 'none';
+    }
+});
+</script>"""
+
+def risk_color(risk):
+    r = int(255 * min(risk, MAX_RISK) / MAX_RISK)
+    return f"rgb({r},{255 - r},{255 - r})"
+
+def node_info(wallet, data):
+    return {
+        "Wallet": wallet,
+        "Flagged": data.get('flagged'),
+        "Reason": data.get('flagged_reason'),
+        "Risk Score": data.get('risk_score'),
+        "Blockchain": data.get('blockchain'),
+        "Incoming": data.get('incoming_count'),
+        "Outgoing": data.get('outgoing_count'),
+        "Total Sent": data.get('total_sent'),
+        "Total Received": data.get('total_received')
+    }
+
+def edge_info(d):
+    return {
+        "Transfers": d['tx_count'],
+        "Total Value": d['total_value'],
+        "First Seen": d['first_seen'],
+        "Last Seen": d['last_seen'],
+        "Token": d['token_type'],
+        "Last Block": d['last_block'],
+        "Total Fee": d['total_fee']
+    }
+
+def write_visualization(net, output_path):
+    net.write_html(output_path)
+    with open(output_path, "r", encoding="utf-8") as f:
+        html_content = f.read()
+    html_content = html_content.replace("</body>", INFO_BOX_JS + "</body>")
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(html_content)
+    print(f"[INFO] Graph visualization saved to {output_path}")
 
 # ------------------------------
 # Visualize wallet graph (subset with dynamic info box)
@@ -201,105 +477,170 @@ def visualize_graph(G, output_file="wallet_graph.html"):
     # -----------------------------
     for node in selected_nodes:
         data = G.nodes[node]
-        risk = min(data["risk_score"], MAX_RISK)
-        r = int(255 * risk / MAX_RISK)
-        g = 255 - r
-        b = 255 - r
-        color = f"rgb({r},{g},{b})"
-        info = {
-            "Wallet": node,
-            "Flagged": data.get('flagged'),
-            "Reason": data.get('flagged_reason'),
-            "Risk Score": data.get('risk_score'),
-            "Blockchain": data.get('blockchain'),
-            "Incoming": data.get('incoming_count'),
-            "Outgoing": data.get('outgoing_count'),
-            "Total Sent": data.get('total_sent'),
-            "Total Received": data.get('total_received')
-        }
-        net.add_node(node, label=node[:10]+"...", color=color, borderWidth=2, fixed=False, **{"info": info})
+        net.add_node(node, label=node[:10]+"...", color=risk_color(data["risk_score"]), borderWidth=2, fixed=False,
+                     **{"info": node_info(node, data)})
 
     # -----------------------------
     # Step 4: Add edges between selected nodes
     # -----------------------------
     for u, v, d in G.edges(data=True):
         if u in selected_nodes and v in selected_nodes:
-            info = {
-                "Tx Hash": d['tx_hash'],
-                "Value": d['value'],
-                "Timestamp": d['timestamp'],
-                "Token": d['token_type'],
-                "Block": d['block_number'],
-                "Fee": d['fee']
-            }
-            net.add_edge(u, v, value=d["value"], title="", **{"info": info})
+            net.add_edge(u, v, value=d["total_value"], title="", **{"info": edge_info(d)})
 
     # -----------------------------
     # Step 5: Write HTML and inject JS
     # -----------------------------
-    net.write_html(output_path)
-    with open(output_path, "r", encoding="utf-8") as f:
-        html_content = f.read()
-
-    js_snippet = """<script type="text/javascript">
-    var network = window.network;
-    var container = document.getElementById('mynetwork');
-    var infoBox = document.createElement('div');
-    infoBox.style.position = 'absolute';
-    infoBox.style.background = 'white';
-    infoBox.style.border = '1px solid black';
-    infoBox.style.padding = '8px';
-    infoBox.style.display = 'none';
-    infoBox.style.zIndex = 10;
-    document.body.appendChild(infoBox);
-    network.on('click', function(params) {
-        if(params.nodes.length > 0){
-            var nodeId = params.nodes[0];
-            var nodeData = network.body.data.nodes.get(nodeId);
-            var info = nodeData.info;
-            infoBox.innerHTML = '';
-            for(var key in info){
-                infoBox.innerHTML += '<b>' + key + ':</b> ' + info[key] + '<br>';
-            }
-            infoBox.style.display = 'block';
-            infoBox.style.left = params.pointer.DOM.x + 'px';
-            infoBox.style.top = params.pointer.DOM.y + 'px';
-        } else if(params.edges.length > 0){
-            var edgeId = params.edges[0];
-            var edgeData = network.body.data.edges.get(edgeId);
-            var info = edgeData.info;
-            infoBox.innerHTML = '';
-            for(var key in info){
-                infoBox.innerHTML += '<b>' + key + ':</b> ' + info[key] + '<br>';
-            }
-            infoBox.style.display = 'block';
-            infoBox.style.left = params.pointer.DOM.x + 'px';
-            infoBox.style.top = params.pointer.DOM.y + 'px';
-        } else {
-            infoBox.style.display = 'none';
-        }
-    });
-    </script>"""
-    html_content = html_content.replace("</body>", js_snippet + "</body>")
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(html_content)
-
-    print(f"[INFO] Graph visualization saved to {output_path}")
+    write_visualization(net, output_path)
 
 # ------------------------------
-# Save full graph for ML
+# Level-of-detail visualization (bounded node/edge budget)
 # ------------------------------
-def save_graph_pickle(G, file_name="wallet_graph.pkl"):
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(script_dir, file_name)
-    with open(file_path, "wb") as f:
-        pickle.dump(G, f)
-    print(f"[INFO] Graph pickle saved to {file_path}")
+def leaf_edges(store, parent, leaves):
+    """Edge positions linking `parent` to each of its single-edge neighbours `leaves`."""
+    sends = store.indptr[leaves + 1] > store.indptr[leaves]
+    row = store.indices[store.indptr[parent]:store.indptr[parent + 1]]
+    return np.where(sends, store.indptr[leaves], store.indptr[parent] + np.searchsorted(row, leaves))
+
+def visualize_graph_lod(store, output_file="wallet_graph.html", max_nodes=VIS_MAX_NODES, max_edges=VIS_MAX_EDGES,
+                        leaf_risk=VIS_LEAF_RISK, seed=None):
+    """
+    Render at most `max_nodes` nodes and `max_edges` edges of the array store, whatever its size.
+    From 20 high-risk and 30 low-risk seed wallets the riskiest frontier wallet is expanded first;
+    low-risk neighbours with a single counterparty edge are folded into one cluster node per
+    wallet, and the riskiest (then highest-value) edges among the shown wallets are kept.
+    """
+    print("[INFO] Visualizing Graph (level of detail)..")
+    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), output_file)
+    rng = np.random.default_rng(seed)
+    risk = np.asarray(store.nodes["risk_score"])
+    in_indptr, _ = store.in_csr()
+    degree = np.diff(store.indptr) + np.diff(in_indptr)
+
+    # -----------------------------
+    # Step 1: Seed with 20 high-risk and 30 low-risk wallets
+    # -----------------------------
+    high_risk_nodes = np.flatnonzero(risk >= MAX_RISK)
+    low_risk_nodes = np.flatnonzero(risk < MAX_RISK)
+    seeds = np.concatenate([
+        rng.choice(high_risk_nodes, min(20, len(high_risk_nodes)), replace=False),
+        rng.choice(low_risk_nodes, min(30, len(low_risk_nodes)), replace=False),
+    ]).astype(np.int64)
+
+    # -----------------------------
+    # Step 2: Expand riskiest wallets first until the node budget is spent
+    # -----------------------------
+    seen = np.zeros(store.num_nodes, dtype=bool)
+    seen[seeds] = True
+    heap = [(-risk[i], int(i)) for i in seeds]
+    heapq.heapify(heap)
+    selected, clusters = [], {}
+    while heap and len(selected) + len(clusters) < max_nodes:
+        _, u = heapq.heappop(heap)
+        selected.append(u)
+        found = store.neighbors(u)
+        found = found[~seen[found]]
+        is_leaf = (degree[found] == 1) & (risk[found] < leaf_risk)
+        is_leaf &= is_leaf.sum() > 1  # a lone leaf is cheaper to draw as itself
+        if is_leaf.any() and len(selected) + len(clusters) < max_nodes:
+            clusters[u] = found[is_leaf]
+            seen[found[is_leaf]] = True
+        found = found[~is_leaf]
+        # No more than the remaining budget can ever be drawn from this wallet's neighbours
+        room = max_nodes - len(selected) - len(clusters)
+        if len(found) > room:
+            found = found[np.argpartition(-risk[found], room)[:room]]
+        seen[found] = True
+        for v in found:
+            heapq.heappush(heap, (-risk[v], int(v)))
+    ids = np.sort(np.asarray(selected, dtype=np.int64))
+
+    # -----------------------------
+    # Step 3: Edges from the selected wallets' adjacency, riskiest and largest first
+    # -----------------------------
+    src, edge_ids = store.induced_edges(ids)
+    dst = store.indices[edge_ids]
+    value = np.asarray(store.edges["total_value"])[edge_ids]
+    keep = np.lexsort((-value, -np.maximum(risk[src], risk[dst])))[:max(max_edges - len(clusters), 0)]
+
+    # -----------------------------
+    # Step 4: Add nodes, clusters and edges to pyvis
+    # -----------------------------
+    net = Network(
+        directed=True,
+        height="750px",
+        width="100%",
+        bgcolor="white",
+        font_color="black",
+        cdn_resources='remote'
+    )
+    net.toggle_physics(True)
+
+    names = {int(i): store.wallet(i) for i in ids}
+    for i, name in names.items():
+        net.add_node(name, label=name[:10]+"...", color=risk_color(risk[i]), borderWidth=2, fixed=False,
+                     **{"info": node_info(name, store.node_attributes(i))})
+    for e, u, v in zip(edge_ids[keep], src[keep], dst[keep]):
+        d = store.edge_attributes(e)
+        net.add_edge(names[int(u)], names[int(v)], value=d["total_value"], title="", **{"info": edge_info(d)})
+
+    folded = 0
+    for parent, leaves in clusters.items():
+        cluster_id = f"cluster:{names[parent]}"
+        leaf_ids = leaf_edges(store, parent, leaves)
+        total_value = float(np.asarray(store.edges["total_value"])[leaf_ids].sum())
+        info = {
+            "Cluster": f"{len(leaves)} low-risk wallets trading only with {names[parent]}",
+            "Wallets": len(leaves),
+            "Max Risk Score": float(risk[leaves].max()),
+            "Transfers": int(np.asarray(store.edges["tx_count"])[leaf_ids].sum()),
+            "Total Value": total_value,
+        }
+        net.add_node(cluster_id, label=f"+{len(leaves)} wallets", color=risk_color(risk[leaves].max()),
+                     shape="box", borderWidth=2, fixed=False, **{"info": info})
+        net.add_edge(names[parent], cluster_id, value=total_value, title="", dashes=True, **{"info": info})
+        folded += len(leaves)
+    print(f"[INFO] Showing {len(ids)} wallets and {len(clusters)} clusters ({folded} wallets folded), "
+          f"{len(keep)} of {len(edge_ids)} edges among them")
+
+    # -----------------------------
+    # Step 5: Write HTML and inject JS
+    # -----------------------------
+    write_visualization(net, output_path)
 
 # ------------------------------
 # Main
 # ------------------------------
 if __name__ == "__main__":
-    G = build_wallet_graph()
-    visualize_graph(G)
-    save_graph_pickle(G)
+    parser = argparse.ArgumentParser(description="Build the wallet graph and propagate risk")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only ingest blocks newer than the saved graph's watermarks")
+    parser.add_argument("--no-visualize", action="store_true", help="skip writing wallet_graph.html")
+    args = parser.parse_args()
+
+    previous = current_version(GRAPH_ARTIFACT_DIR)
+    incremental = args.incremental and previous is not None
+    if incremental and not WalletGraphStore.open_artifact(GRAPH_ARTIFACT_DIR).manifest.get("watermarks"):
+        print(f"[INFO] Graph artifact {previous} has no block watermarks (e.g. converted from a pickle)")
+        incremental = False
+    if incremental:
+        store, watermarks = update_wallet_graph()
+    else:
+        if args.incremental:
+            print(f"[INFO] No incremental base under {GRAPH_ARTIFACT_DIR}, running a full build")
+        store, watermarks = build_wallet_graph()
+    manifest = store.save_artifact(GRAPH_ARTIFACT_DIR, {
+        "watermarks": watermarks,
+        "provenance": {
+            "builder": "graph_builder.py",
+            "mode": "incremental" if incremental else "full",
+            "parent_version": previous,
+            "database": {k: DB_CONFIG[k] for k in ("dbname", "host", "port")},
+            "chunk_size": CHUNK_SIZE,
+        },
+    }, shard_max_nodes=SHARD_MAX_NODES)
+    print(f"[INFO] Graph artifact {manifest['version']} saved to {GRAPH_ARTIFACT_DIR} (watermarks: {watermarks})")
+    if "shards" in manifest:
+        print(f"[INFO] Split into {len(manifest['shards']['shards'])} shards by chain and connected component")
+
+    if not args.no_visualize:
+        visualize_graph_lod(store)
@@ -0,0 +1,142 @@
+# risk_propagation.py
+import numpy as np
+import scipy.sparse as sp
+from tqdm import tqdm
+
+MAX_RISK = 10
+MAX_HOPS = 3
+
+# Flagged sources expanded together per sparse BFS pass; bounds the frontier matrices' memory
+BLOCK_SIZE = 1024
+
+# Closest flagged sources remembered per node to explain its proximity risk
+TOP_SOURCES = 3
+
+# ------------------------------
+# Undirected adjacency (built once)
+# ------------------------------
+def undirected_adjacency(num_nodes, src, dst):
+    """Symmetric 0/1 CSR adjacency ignoring edge direction and self-loops."""
+    keep = src != dst
+    rows = np.concatenate([src[keep], dst[keep]])
+    cols = np.concatenate([dst[keep], src[keep]])
+    A = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(num_nodes, num_nodes))
+    A.data[:] = 1  # collapse duplicate pairs
+    return A
+
+# ------------------------------
+# Multi-source BFS with hop counts
+# ------------------------------
+def iter_hop_layers(A, sources, max_hops=MAX_HOPS, block_size=BLOCK_SIZE, desc="Propagating from flagged wallets"):
+    """
+    Exact multi-source BFS over the undirected adjacency `A`, a block of sources at a time.
+    Yields (hop, block_sources, layer) where `layer` is a sparse (num_nodes x len(block_sources))
+    0/1 matrix marking the nodes whose shortest distance to each source is exactly `hop`.
+    """
+    num_nodes = A.shape[0]
+    sources = np.asarray(sources, dtype=np.int64)
+    for start in tqdm(range(0, len(sources), block_size), desc=desc):
+        block = sources[start:start + block_size]
+        cols = np.arange(len(block))
+        frontier = sp.csr_matrix((np.ones(len(block), dtype=np.int32), (block, cols)), shape=(num_nodes, len(block)))
+        visited = frontier.copy()
+        for hop in range(1, max_hops + 1):
+            reached = A @ frontier
+            reached.data[:] = 1
+            layer = reached - reached.multiply(visited)
+            layer.eliminate_zeros()
+            if layer.nnz == 0:
+                break
+            yield hop, block, layer
+            visited = visited + layer
+            frontier = layer
+
+class NearestSources:
+    """
+    Per-node top-k closest sources, nearest first (ties by source id): `sources[v]` holds node
+    ids padded with -1 and `hops[v]` their distances. Fed from the BFS layers as they are produced.
+    """
+
+    def __init__(self, num_nodes, k=TOP_SOURCES):
+        self.sources = np.full((num_nodes, k), -1, dtype=np.int64)
+        self.hops = np.zeros((num_nodes, k), dtype=np.int8)
+
+    def add(self, nodes, hop, sources):
+        """Record that each of `sources` is `hop` hops from the matching entry of `nodes`."""
+        if len(nodes) == 0:
+            return
+        k = self.sources.shape[1]
+        touched = np.unique(nodes)
+        old_sources = self.sources[touched].ravel()
+        valid = old_sources >= 0
+        node = np.concatenate([np.repeat(touched, k)[valid], nodes])
+        source = np.concatenate([old_sources[valid], sources])
+        hops = np.concatenate([self.hops[touched].ravel()[valid], np.full(len(nodes), hop, dtype=np.int8)])
+        order = np.lexsort((source, hops, node))
+        node, source, hops = node[order], source[order], hops[order]
+        rank = np.arange(len(node)) - np.searchsorted(node, node)
+        keep = rank < k
+        self.sources[touched] = -1
+        self.hops[touched] = 0
+        self.sources[node[keep], rank[keep]] = source[keep]
+        self.hops[node[keep], rank[keep]] = hops[keep]
+
+def hop_counts(A, sources, max_hops=MAX_HOPS, block_size=BLOCK_SIZE, nearest=None):
+    """
+    counts[v, d-1] = number of sources whose shortest undirected distance to v is exactly d.
+    A `NearestSources` passed as `nearest` also collects each node's closest sources.
+    """
+    counts = np.zeros((A.shape[0], max_hops), dtype=np.int64)
+    for hop, block, layer in iter_hop_layers(A, sources, max_hops, block_size):
+        counts[:, hop - 1] += np.asarray(layer.sum(axis=1)).ravel()
+        if nearest is not None:
+            layer = layer.tocoo()
+            nearest.add(layer.row, hop, block[layer.col])
+    return counts
+
+def propagate_risk(A, base_risk, sources, max_hops=MAX_HOPS, max_risk=MAX_RISK, block_size=BLOCK_SIZE, nearest=None):
+    """
+    Decayed proximity risk: every flagged source within `max_hops` adds max_risk / distance
+    to a non-flagged node, capped at max_risk; flagged sources themselves get max_risk.
+    """
+    counts = hop_counts(A, sources, max_hops, block_size, nearest)
+    decay = max_risk / np.arange(1, max_hops + 1)
+    risk = np.minimum(max_risk, np.asarray(base_risk, dtype=np.float64) + counts @ decay)
+    risk[np.asarray(sources, dtype=np.int64)] = max_risk
+    return risk
+
+# ------------------------------
+# Local re-propagation (incremental updates)
+# ------------------------------
+def neighborhood(A, nodes, hops):
+    """Sorted ids of all nodes within `hops` of any of `nodes` (inclusive) in the undirected adjacency `A`."""
+    reached = np.zeros(A.shape[0], dtype=bool)
+    reached[np.asarray(nodes, dtype=np.int64)] = True
+    frontier = reached.copy()
+    for _ in range(hops):
+        if not frontier.any():
+            break
+        frontier = (A @ frontier.astype(np.int32) > 0) & ~reached
+        reached |= frontier
+    return np.flatnonzero(reached)
+
+def propagate_risk_to(A, targets, is_source, max_hops=MAX_HOPS, max_risk=MAX_RISK, block_size=BLOCK_SIZE,
+                      nearest=None):
+    """
+    Same scores as `propagate_risk`, computed only for the sorted node ids `targets`: a BFS from
+    each target counts the sources (boolean mask `is_source`) at exactly 1..max_hops hops.
+    `nearest` likewise collects the closest sources of the targets only.
+    """
+    targets = np.asarray(targets, dtype=np.int64)
+    source_vector = is_source.astype(np.int64)
+    counts = np.zeros((len(targets), max_hops), dtype=np.int64)
+    for hop, block, layer in iter_hop_layers(A, targets, max_hops, block_size, desc="Re-propagating affected wallets"):
+        counts[np.searchsorted(targets, block), hop - 1] += layer.T @ source_vector
+        if nearest is not None:
+            layer = layer.tocoo()
+            found = is_source[layer.row]
+            nearest.add(block[layer.col[found]], hop, layer.row[found])
+    decay = max_risk / np.arange(1, max_hops + 1)
+    risk = np.minimum(max_risk, counts @ decay)
+    risk[is_source[targets]] = max_risk
+    return risk
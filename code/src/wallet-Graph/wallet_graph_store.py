@@ -0,0 +1,873 @@
+# wallet_graph_store.py
+# Compact, array-backed wallet graph: integer node ids, CSR adjacency over distinct
+# (sender, recipient) pairs and NumPy columns for node stats and aggregated edge stats.
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+import numpy as np
+import networkx as nx
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+BLOCKCHAINS = ["BTC", "ETH"]
+TOKEN_TYPES = ["BTC", "ETH_native", "ERC20"]
+
+# Reason recorded for wallets flagged by risk propagation rather than by an upstream source
+PROXIMITY_REASON = "Proximity to risky wallets"
+
+# Per-node numeric columns, indexed by node id
+NODE_COLUMNS = {
+    "incoming_count": np.int64,
+    "outgoing_count": np.int64,
+    "total_sent": np.float64,
+    "total_received": np.float64,
+    "risk_score": np.float64,
+}
+# Per-edge columns, aligned with the CSR `indices` array (one row per distinct sender -> recipient pair)
+EDGE_COLUMNS = {
+    "tx_count": np.int64,
+    "total_value": np.float64,
+    "total_fee": np.float64,
+    "first_ts": np.float64,    # epoch seconds, NaN when unknown
+    "last_ts": np.float64,
+    "last_block": np.int64,    # highest block number of the pair's transfers
+    "token_type": np.int8,     # code into TOKEN_TYPES of the transfer in last_block
+}
+
+# Versioned on-disk layout: <root>/CURRENT names the live version directory, which holds
+# one .npy file per array plus manifest.json (format, version, counts, checksums, provenance)
+ARTIFACT_FORMAT = "wallet-graph"
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 3
+
+# Each version also holds the graph split into shards (whole weakly connected components of one
+# chain, small ones packed up to about SHARD_MAX_NODES wallets) under shards/<id>/, with the
+# wallet -> shard index in shard_of.npy, so readers can map just the shard a wallet lives in
+SHARDS_DIR = "shards"
+SHARD_MAX_NODES = 1_000_000
+# Shards a ShardedGraph keeps open
+SHARD_CACHE_SIZE = 8
+
+# CSR entries handled per block when transposing
+TRANSPOSE_BLOCK_EDGES = 4_000_000
+
+# GraphStoreBuilder folds buffered transfer rows into per-pair aggregates once at least this
+# many are pending (and at least as many as already aggregated), bounding build memory
+COMPACT_ROWS = 2_000_000
+
+# ------------------------------
+# Helpers
+# ------------------------------
+def to_epoch(ts):
+    """Epoch seconds for a DB timestamp (naive values are UTC); NaN when missing."""
+    if ts is None:
+        return math.nan
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            return math.nan
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+def from_epoch(seconds):
+    if math.isnan(seconds):
+        return None
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+
+def current_version(root):
+    """Version name in `root/CURRENT`, or None if nothing has been written yet. Cheap enough to poll."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def list_versions(root):
+    """Complete version directories under `root`, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root)
+                  if not d.startswith(".") and os.path.exists(os.path.join(root, d, MANIFEST_FILE)))
+
+def row_positions(indptr, rows):
+    """Positions in the CSR `indices` array of every entry of rows `rows`, row by row."""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+
+def gather_rows(indptr, indices, rows):
+    """Concatenated CSR rows `rows`."""
+    return np.asarray(indices[row_positions(indptr, rows)], dtype=np.int64)
+
+def row_blocks(indptr, block_edges):
+    """(start, stop) row ranges covering a CSR with about `block_edges` entries each (one longer row at least)."""
+    n = len(indptr) - 1
+    a = 0
+    while a < n:
+        b = int(np.searchsorted(indptr, int(indptr[a]) + block_edges, side="right")) - 1
+        b = min(max(b, a + 1), n)
+        yield a, b
+        a = b
+
+def transpose_csr(indptr, indices, out=None, block_edges=TRANSPOSE_BLOCK_EDGES):
+    """
+    (indptr, indices) of the transposed CSR, each row sorted, filled a block of rows at a time
+    so that no full edge list is materialized. `out` may be a preallocated (e.g. memory-mapped)
+    int64 array of len(indices) to fill.
+    """
+    n = len(indptr) - 1
+    t_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n), out=t_indptr[1:])
+    t_indices = np.empty(len(indices), dtype=np.int64) if out is None else out
+    cursor = t_indptr[:-1].copy()  # next free slot of each transposed row
+    for a, b in row_blocks(indptr, block_edges):
+        lo, hi = int(indptr[a]), int(indptr[b])
+        if lo == hi:
+            continue
+        rows = np.repeat(np.arange(a, b, dtype=np.int64), np.diff(np.asarray(indptr[a:b + 1])))
+        cols = np.asarray(indices[lo:hi], dtype=np.int64)
+        # Stable by column, so rows stay ascending within each transposed row
+        order = np.argsort(cols, kind="stable")
+        rows, cols = rows[order], cols[order]
+        starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]])
+        counts = np.diff(np.r_[starts, len(cols)])
+        t_indices[cursor[cols] + np.arange(len(cols)) - np.repeat(starts, counts)] = rows
+        cursor[cols[starts]] += counts
+    return t_indptr, t_indices
+
+def search_wallet(wallets, wallet):
+    """Position of `wallet` in the sorted bytes array `wallets`, or -1 if absent."""
+    key = wallet.encode("utf-8")
+    if len(key) > wallets.dtype.itemsize:
+        return -1
+    i = int(np.searchsorted(wallets, key))
+    if i < len(wallets) and wallets[i] == key:
+        return i
+    return -1
+
+def array_sha256(array):
+    array = np.ascontiguousarray(array)
+    return hashlib.sha256(memoryview(array).cast("B")).hexdigest() if array.size else hashlib.sha256().hexdigest()
+
+def write_arrays(directory, arrays):
+    """Save each array as <name>.npy under `directory`; returns {name: {dtype, shape, sha256}}."""
+    files = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        with open(os.path.join(directory, name + ".npy"), "wb") as f:
+            np.save(f, array)
+        files[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "sha256": array_sha256(array)}
+    return files
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != ARTIFACT_FORMAT or manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported graph artifact {directory}: "
+                         f"{manifest.get('format')} v{manifest.get('format_version')}")
+    return manifest
+
+def write_manifest(directory, manifest):
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+def shard_dir(version_dir, shard):
+    return os.path.join(version_dir, SHARDS_DIR, f"{shard:05d}")
+
+def encode_wallets(wallets):
+    return np.array([w.encode("utf-8") for w in wallets], dtype=np.bytes_)
+
+# ------------------------------
+# Store
+# ------------------------------
+class WalletGraphStore:
+    """
+    Node i is the wallet `wallets[i]`; `wallets` is sorted, so ids are looked up by binary search.
+    Out-edges of node i are `indices[indptr[i]:indptr[i + 1]]` with their stats at the same positions
+    in `edges`. Repeated transfers between the same pair are aggregated into one edge.
+    Row i of `risk_sources` / `risk_source_hops` lists the closest flagged wallets that gave
+    node i its proximity risk and their hop distances (-1 padded, zero columns when not computed).
+    """
+
+    def __init__(self, wallets, indptr, indices, nodes, edges, blockchain, flagged, reason_codes, reasons,
+                 risk_sources=None, risk_source_hops=None):
+        self.wallets = wallets              # sorted fixed-width utf-8 bytes
+        self.indptr = indptr
+        self.indices = indices
+        self.nodes = nodes                  # {column: array[num_nodes]}
+        self.edges = edges                  # {column: array[num_edges]}
+        self.blockchain = blockchain        # int8 code into BLOCKCHAINS
+        self.flagged = flagged              # bool
+        self.reason_codes = reason_codes    # int32 code into `reasons`, -1 for none
+        self.reasons = reasons
+        self.risk_sources = risk_sources if risk_sources is not None else np.full((len(wallets), 0), -1, dtype=np.int64)
+        self.risk_source_hops = (risk_source_hops if risk_source_hops is not None
+                                 else np.zeros(self.risk_sources.shape, dtype=np.int8))
+        self.manifest = None                # set when saved as / opened from an artifact
+        self._in_csr = None
+
+    @property
+    def num_nodes(self):
+        return len(self.wallets)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def edge_sources(self):
+        """Source node id of every edge (the CSR row expanded)."""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+
+    def wallet(self, i):
+        return self.wallets[i].decode("utf-8")
+
+    def index_of(self, wallet):
+        """Node id of `wallet`, or -1 if it is not in the graph."""
+        return search_wallet(self.wallets, wallet)
+
+    def __contains__(self, wallet):
+        return self.index_of(wallet) >= 0
+
+    def reason(self, i):
+        code = self.reason_codes[i]
+        return self.reasons[code] if code >= 0 else None
+
+    def set_reason(self, ids, reason):
+        if reason not in self.reasons:
+            self.reasons.append(reason)
+        self.reason_codes[ids] = self.reasons.index(reason)
+
+    def set_risk_sources(self, ids, sources, hops):
+        """Replace the closest-source rows of node ids `ids` (widening the arrays if `sources` has more columns)."""
+        width = sources.shape[1]
+        if width > self.risk_sources.shape[1]:
+            risk_sources = np.full((self.num_nodes, width), -1, dtype=np.int64)
+            risk_source_hops = np.zeros((self.num_nodes, width), dtype=np.int8)
+            risk_sources[:, :self.risk_sources.shape[1]] = self.risk_sources
+            risk_source_hops[:, :self.risk_sources.shape[1]] = self.risk_source_hops
+            self.risk_sources, self.risk_source_hops = risk_sources, risk_source_hops
+        self.risk_sources[ids] = -1
+        self.risk_sources[ids, :width] = sources
+        self.risk_source_hops[ids] = 0
+        self.risk_source_hops[ids, :width] = hops
+
+    def risk_sources_of(self, i):
+        """[{"wallet", "hops"}] of the closest flagged wallets behind node i's proximity risk, nearest first."""
+        return [{"wallet": self.wallet(s), "hops": int(h)}
+                for s, h in zip(self.risk_sources[i], self.risk_source_hops[i]) if s >= 0]
+
+    def apply_flags(self, flagged_wallets):
+        """Flag wallets from `flagged_wallets` ({wallet: {"reason", "risk_score"}}) that are in the graph."""
+        for wallet, info in flagged_wallets.items():
+            i = self.index_of(wallet)
+            if i >= 0:
+                self.flagged[i] = True
+                self.nodes["risk_score"][i] = info["risk_score"] or 0
+                if info.get("reason"):
+                    self.set_reason(i, info["reason"])
+
+    def new_pair_nodes(self, base):
+        """Sorted ids of wallets on sender -> recipient pairs of this store that `base` does not have."""
+        base_ids = np.searchsorted(self.wallets, base.wallets)
+        n = self.num_nodes
+        base_keys = base_ids[base.edge_sources()] * n + base_ids[np.asarray(base.indices)]
+        src = self.edge_sources()
+        new = ~np.isin(src * n + self.indices, base_keys)
+        return np.union1d(src[new], self.indices[new]).astype(np.int64)
+
+    def seeds(self):
+        """Flagged wallets that are propagation sources (flagged upstream, not by proximity)."""
+        seed = self.flagged.copy()
+        if PROXIMITY_REASON in self.reasons:
+            seed &= self.reason_codes != self.reasons.index(PROXIMITY_REASON)
+        return seed
+
+    def nbytes(self):
+        arrays = [self.wallets, self.indptr, self.indices, self.blockchain, self.flagged, self.reason_codes,
+                  self.risk_sources, self.risk_source_hops]
+        arrays += list(self.nodes.values()) + list(self.edges.values())
+        return sum(a.nbytes for a in arrays)
+
+    def in_csr(self):
+        """(indptr, indices) of in-edges: row i lists the senders of wallet i, sorted."""
+        if self._in_csr is None:
+            self._in_csr = transpose_csr(self.indptr, self.indices)
+        return self._in_csr
+
+    def k_hop(self, root, max_hops=2):
+        """Sorted ids of all nodes within `max_hops` of node `root`, ignoring edge direction."""
+        in_indptr, in_indices = self.in_csr()
+        visited = np.array([root], dtype=np.int64)
+        frontier = visited
+        for _ in range(max_hops):
+            if len(frontier) == 0:
+                break
+            reached = np.unique(np.concatenate([gather_rows(self.indptr, self.indices, frontier),
+                                                gather_rows(in_indptr, in_indices, frontier)]))
+            frontier = np.setdiff1d(reached, visited, assume_unique=True)
+            visited = np.union1d(visited, frontier)
+        return visited
+
+    # ------------------------------
+    # Versioned artifact (memory-mappable .npy files + manifest)
+    # ------------------------------
+    def arrays(self):
+        """Every array of the store by artifact file name (without .npy)."""
+        in_indptr, in_indices = self.in_csr()
+        arrays = {
+            "wallets": self.wallets, "indptr": self.indptr, "indices": self.indices,
+            "in_indptr": in_indptr, "in_indices": in_indices,
+            "blockchain": self.blockchain, "flagged": self.flagged, "reason_codes": self.reason_codes,
+            "risk_sources": self.risk_sources, "risk_source_hops": self.risk_source_hops,
+        }
+        arrays.update({f"node_{name}": column for name, column in self.nodes.items()})
+        arrays.update({f"edge_{name}": column for name, column in self.edges.items()})
+        return arrays
+
+    def save_artifact(self, root, meta=None, keep=KEEP_VERSIONS, shard_max_nodes=SHARD_MAX_NODES):
+        """
+        Write the store as a new version directory under `root` and point `root/CURRENT` at it.
+        `meta` (watermarks, provenance, ...) is merged into the manifest. Unless `shard_max_nodes`
+        is 0 the version also gets per-component shards (see `shard_assignment`). The newest `keep`
+        versions are retained so readers still mapping an older one are not cut off.
+        Returns the manifest.
+        """
+        os.makedirs(root, exist_ok=True)
+        created_at = datetime.now(timezone.utc)
+        tmp_dir = os.path.join(root, f".tmp-{os.getpid()}-{created_at:%Y%m%dT%H%M%S%f}")
+        os.makedirs(tmp_dir)
+
+        arrays = self.arrays()
+        if shard_max_nodes:
+            shard_of, shard_chains, shard_components = self.shard_assignment(shard_max_nodes)
+            arrays["shard_of"] = shard_of
+        files = write_arrays(tmp_dir, arrays)
+        digest = hashlib.sha256()
+        for name, info in files.items():
+            digest.update(f"{name}:{info['sha256']}".encode())
+
+        version = f"{created_at:%Y%m%dT%H%M%SZ}-{digest.hexdigest()[:8]}"
+        manifest = dict(meta or {})
+        manifest.update({
+            "format": ARTIFACT_FORMAT,
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "version": version,
+            "created_at": created_at.isoformat(),
+            "num_nodes": self.num_nodes,
+            "num_edges": self.num_edges,
+            "reasons": self.reasons,
+            "files": files,
+        })
+        if shard_max_nodes:
+            manifest["shards"] = {"max_nodes": shard_max_nodes, "shards": self.write_shards(
+                tmp_dir, version, shard_of, shard_chains, shard_components)}
+        write_manifest(tmp_dir, manifest)
+
+        version_dir = os.path.join(root, version)
+        if os.path.exists(version_dir):  # identical content written within the same second
+            shutil.rmtree(tmp_dir)
+        else:
+            os.replace(tmp_dir, version_dir)
+        tmp_path = os.path.join(root, CURRENT_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+        os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+        for old in list_versions(root)[:-keep] if keep else []:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+        self.manifest = manifest
+        return manifest
+
+    @classmethod
+    def open_artifact(cls, root, version=None, mmap_mode="r", verify=False):
+        """
+        Open a version under `root` (default: CURRENT). Arrays are memory-mapped read-only, so
+        opening takes milliseconds and pages are shared by every process mapping the same
+        version. `verify=True` also checks each file's sha256 (reads everything once).
+        """
+        version = version or current_version(root)
+        if version is None:
+            raise FileNotFoundError(f"No wallet graph artifact under {root}")
+        return cls.open_directory(os.path.join(root, version), mmap_mode, verify)
+
+    @classmethod
+    def open_directory(cls, directory, mmap_mode="r", verify=False):
+        """Open a version directory or one of its shard directories."""
+        manifest = read_manifest(directory)
+        arrays = {}
+        for name, info in manifest["files"].items():
+            array = np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode if np.prod(info["shape"]) else None)
+            if array.dtype.str != info["dtype"] or list(array.shape) != info["shape"]:
+                raise ValueError(f"Graph artifact file {name}.npy does not match its manifest")
+            if verify and array_sha256(array) != info["sha256"]:
+                raise ValueError(f"Graph artifact file {name}.npy failed its checksum")
+            arrays[name] = array
+
+        store = cls(
+            arrays["wallets"], arrays["indptr"], arrays["indices"],
+            {name: arrays[f"node_{name}"] for name in NODE_COLUMNS},
+            {name: arrays[f"edge_{name}"] for name in EDGE_COLUMNS},
+            arrays["blockchain"], arrays["flagged"], arrays["reason_codes"], list(manifest["reasons"]),
+            arrays.get("risk_sources"), arrays.get("risk_source_hops")  # absent in versions built before them
+        )
+        store._in_csr = (arrays["in_indptr"], arrays["in_indices"])
+        store.manifest = manifest
+        return store
+
+    # ------------------------------
+    # Shards (chain x weakly connected component)
+    # ------------------------------
+    def shard_assignment(self, max_nodes=SHARD_MAX_NODES):
+        """
+        (shard id per node, chain code per shard, components per shard). Every weakly connected
+        component goes whole into one shard of its chain (BTC if it mixes chains); a shard holds
+        either one component of at least `max_nodes` wallets or smaller ones packed up to about that.
+        """
+        n = self.num_nodes
+        A = sp.csr_matrix((np.ones(self.num_edges, dtype=np.int8), np.asarray(self.indices), np.asarray(self.indptr)),
+                          shape=(n, n))
+        num_components, labels = connected_components(A, directed=True, connection="weak")
+        sizes = np.bincount(labels, minlength=num_components)
+        chain = np.full(num_components, len(BLOCKCHAINS), dtype=np.int64)
+        np.minimum.at(chain, labels, self.blockchain)
+
+        # Components of max_nodes or more get a shard each; within a chain the others (largest
+        # first) fill bins of max_nodes by their starting offset
+        order = np.lexsort((-sizes, chain))
+        big = sizes >= max_nodes
+        slot = np.zeros(num_components, dtype=np.int64)
+        slot[big] = -1 - np.flatnonzero(big)
+        for code in np.unique(chain):
+            members = order[(chain[order] == code) & ~big[order]]
+            slot[members] = (np.cumsum(sizes[members]) - sizes[members]) // max_nodes
+        keys, component_shard = np.unique(np.stack([chain, slot], axis=1), axis=0, return_inverse=True)
+        component_shard = component_shard.reshape(-1)
+        shard_of = component_shard.astype(np.int32)[labels]
+        shard_chains = keys[:, 0].astype(np.int8)
+        return shard_of, shard_chains, np.bincount(component_shard, minlength=len(keys))
+
+    def take(self, ids):
+        """Store induced by the sorted node ids `ids` (node stats are kept as in the full graph)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = row_positions(self.indptr, ids)
+        src = np.repeat(np.arange(len(ids), dtype=np.int64), np.asarray(self.indptr[ids + 1] - self.indptr[ids]))
+        keep = np.isin(self.indices[positions], ids)
+        positions, src = positions[keep], src[keep]
+        dst = np.searchsorted(ids, self.indices[positions])
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(ids)), out=indptr[1:])
+        # Sources within a few hops share the component, so they are in `ids` when taking whole components
+        risk_sources = np.asarray(self.risk_sources[ids])
+        found = np.isin(risk_sources, ids)
+        risk_sources = np.where(found, np.searchsorted(ids, risk_sources), -1)
+        return WalletGraphStore(
+            np.asarray(self.wallets[ids]), indptr, dst.astype(np.int64),
+            {name: np.asarray(column[ids]) for name, column in self.nodes.items()},
+            {name: np.asarray(column[positions]) for name, column in self.edges.items()},
+            np.asarray(self.blockchain[ids]), np.asarray(self.flagged[ids]), np.asarray(self.reason_codes[ids]),
+            list(self.reasons), risk_sources, np.where(found, np.asarray(self.risk_source_hops[ids]), 0).astype(np.int8)
+        )
+
+    def write_shards(self, version_dir, version, shard_of, shard_chains, shard_components):
+        """Write each shard as its own mini artifact under version_dir/shards/; returns their summaries."""
+        order = np.argsort(shard_of, kind="stable")
+        bounds = np.searchsorted(shard_of[order], np.arange(len(shard_chains) + 1))
+        shards = []
+        for k, chain in enumerate(shard_chains):
+            shard = self.take(order[bounds[k]:bounds[k + 1]])
+            directory = shard_dir(version_dir, k)
+            os.makedirs(directory)
+            summary = {"shard": k, "chain": BLOCKCHAINS[chain], "num_nodes": shard.num_nodes,
+                       "num_edges": shard.num_edges, "components": int(shard_components[k])}
+            write_manifest(directory, {
+                "format": ARTIFACT_FORMAT,
+                "format_version": ARTIFACT_FORMAT_VERSION,
+                "version": version,
+                **summary,
+                "reasons": shard.reasons,
+                "files": write_arrays(directory, shard.arrays()),
+            })
+            shards.append(summary)
+        return shards
+
+    # ------------------------------
+    # NetworkX conversion (visualization paths)
+    # ------------------------------
+    def node_attributes(self, i):
+        return {
+            "color": "white",
+            "borderWidth": 2,
+            "flagged": bool(self.flagged[i]),
+            "flagged_reason": self.reason(i),
+            "risk_score": float(self.nodes["risk_score"][i]),
+            "blockchain": BLOCKCHAINS[self.blockchain[i]],
+            "incoming_count": int(self.nodes["incoming_count"][i]),
+            "outgoing_count": int(self.nodes["outgoing_count"][i]),
+            "total_received": float(self.nodes["total_received"][i]),
+            "total_sent": float(self.nodes["total_sent"][i]),
+        }
+
+    def edge_attributes(self, e):
+        return {
+            "tx_count": int(self.edges["tx_count"][e]),
+            "total_value": float(self.edges["total_value"][e]),
+            "total_fee": float(self.edges["total_fee"][e]),
+            "first_seen": from_epoch(float(self.edges["first_ts"][e])),
+            "last_seen": from_epoch(float(self.edges["last_ts"][e])),
+            "last_block": int(self.edges["last_block"][e]),
+            "token_type": TOKEN_TYPES[self.edges["token_type"][e]],
+        }
+
+    def to_networkx(self):
+        G = nx.DiGraph()
+        names = [self.wallet(i) for i in range(self.num_nodes)]
+        G.add_nodes_from((names[i], self.node_attributes(i)) for i in range(self.num_nodes))
+        src = self.edge_sources()
+        G.add_edges_from((names[src[e]], names[self.indices[e]], self.edge_attributes(e))
+                         for e in range(self.num_edges))
+        return G
+
+    def neighbors(self, i):
+        """Sorted ids of the wallets node `i` sent to or received from, excluding itself."""
+        in_indptr, in_indices = self.in_csr()
+        found = np.union1d(self.indices[self.indptr[i]:self.indptr[i + 1]], in_indices[in_indptr[i]:in_indptr[i + 1]])
+        return found[found != i].astype(np.int64)
+
+    def induced_edges(self, ids):
+        """(src, edge positions) of the edges among the sorted node ids `ids`, read from their CSR rows only."""
+        ids = np.asarray(ids, dtype=np.int64)
+        edge_ids = row_positions(self.indptr, ids)
+        src = np.repeat(ids, self.indptr[ids + 1] - self.indptr[ids])
+        keep = np.isin(self.indices[edge_ids], ids)
+        return src[keep], edge_ids[keep]
+
+    def subgraph(self, ids):
+        """NetworkX DiGraph induced by the sorted node ids `ids`, with the same attributes as `to_networkx`."""
+        G = nx.DiGraph()
+        names = {int(i): self.wallet(i) for i in ids}
+        G.add_nodes_from((names[i], self.node_attributes(i)) for i in names)
+        src, edge_ids = self.induced_edges(ids)
+        G.add_edges_from((names[int(u)], names[int(self.indices[e])], self.edge_attributes(e))
+                         for u, e in zip(src, edge_ids))
+        return G
+
+    @classmethod
+    def from_networkx(cls, G):
+        """
+        Convert a wallet DiGraph, either from `to_networkx` or an older pickle whose edges
+        carry a single transfer (`value`, `timestamp`, `block_number`, `fee`).
+        """
+        builder = GraphStoreBuilder()
+        # Intern in sorted order so provisional ids already match the final ones
+        for wallet in sorted(G.nodes, key=lambda w: w.encode("utf-8")):
+            builder.intern(wallet, G.nodes[wallet].get("blockchain") or "ETH")
+
+        n = len(G)
+        src = np.empty(G.number_of_edges(), dtype=np.int64)
+        dst = np.empty(G.number_of_edges(), dtype=np.int64)
+        columns = {name: np.zeros(G.number_of_edges(), dtype=dtype) for name, dtype in EDGE_COLUMNS.items()}
+        for e, (u, v, d) in enumerate(G.edges(data=True)):
+            src[e], dst[e] = builder.ids[u], builder.ids[v]
+            if "tx_count" in d:
+                first_ts, last_ts = to_epoch(d.get("first_seen")), to_epoch(d.get("last_seen"))
+                row = (d["tx_count"], d.get("total_value"), d.get("total_fee"), first_ts, last_ts, d.get("last_block"))
+            else:
+                ts = to_epoch(d.get("timestamp"))
+                row = (1, d.get("value"), d.get("fee"), ts, ts, d.get("block_number"))
+            for name, value in zip(("tx_count", "total_value", "total_fee", "first_ts", "last_ts", "last_block"), row):
+                columns[name][e] = value if value is not None else 0
+            token = d.get("token_type")
+            columns["token_type"][e] = TOKEN_TYPES.index(token) if token in TOKEN_TYPES else TOKEN_TYPES.index("ETH_native")
+
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        edges = {name: column[order] for name, column in columns.items()}
+
+        wallets = encode_wallets(builder.ids)
+        nodes = {name: np.zeros(n, dtype=dtype) for name, dtype in NODE_COLUMNS.items()}
+        flagged = np.zeros(n, dtype=bool)
+        reason_codes = np.full(n, -1, dtype=np.int32)
+        store = cls(wallets, indptr, dst[order], nodes, edges,
+                    np.array(builder.chains, dtype=np.int8), flagged, reason_codes, [])
+        for i, wallet in enumerate(builder.ids):
+            data = G.nodes[wallet]
+            for name in NODE_COLUMNS:
+                nodes[name][i] = data.get(name, 0) or 0
+            flagged[i] = bool(data.get("flagged"))
+            if data.get("flagged_reason"):
+                store.set_reason(i, data["flagged_reason"])
+        return store
+
+# ------------------------------
+# Sharded reader (serving)
+# ------------------------------
+class VersionPrunedError(FileNotFoundError):
+    """A shard was requested from an artifact version that newer builds have since pruned."""
+
+class ShardedGraph:
+    """
+    One artifact version read shard by shard: only the wallet -> shard index is mapped up front,
+    and the `max_loaded` most recently used shards are kept open, after `prepare(store)` (e.g.
+    building a snapshot) when given. Versions written without shards are served as one shard.
+    Opening a shard of a version pruned since (after KEEP_VERSIONS newer builds) raises
+    VersionPrunedError; callers reopen the current version.
+    """
+
+    def __init__(self, root, version=None, max_loaded=SHARD_CACHE_SIZE, prepare=None):
+        version = version or current_version(root)
+        if version is None:
+            raise FileNotFoundError(f"No wallet graph artifact under {root}")
+        self.version_dir = os.path.join(root, version)
+        self.manifest = read_manifest(self.version_dir)
+        self.max_loaded = max_loaded
+        self.prepare = prepare
+        self.wallets = np.load(os.path.join(self.version_dir, "wallets.npy"), mmap_mode="r")
+        sharded = "shards" in self.manifest
+        self.shard_of = np.load(os.path.join(self.version_dir, "shard_of.npy"), mmap_mode="r") if sharded else None
+        self.shards = self.manifest["shards"]["shards"] if sharded else [
+            {"shard": 0, "num_nodes": self.manifest["num_nodes"], "num_edges": self.manifest["num_edges"]}]
+        self._loaded = OrderedDict()  # shard id -> prepared store
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def num_shards(self):
+        return len(self.shards)
+
+    def shard_id(self, wallet):
+        """Shard holding `wallet`, or -1 if it is not in the graph."""
+        i = search_wallet(self.wallets, wallet)
+        if i < 0 or self.shard_of is None:
+            return i if i < 0 else 0
+        return int(self.shard_of[i])
+
+    def __contains__(self, wallet):
+        return self.shard_id(wallet) >= 0
+
+    def shard(self, k):
+        with self._lock:
+            if k in self._loaded:
+                self._loaded.move_to_end(k)
+                self.hits += 1
+                return self._loaded[k]
+            self.misses += 1
+            directory = shard_dir(self.version_dir, k) if self.shard_of is not None else self.version_dir
+            try:
+                store = WalletGraphStore.open_directory(directory)
+            except FileNotFoundError:
+                if os.path.isdir(self.version_dir):
+                    raise
+                raise VersionPrunedError(f"Graph version {self.manifest['version']} was pruned; reopen the current version")
+            loaded = self.prepare(store) if self.prepare else store
+            self._loaded[k] = loaded
+            while len(self._loaded) > max(self.max_loaded, 1):
+                self._loaded.popitem(last=False)
+                self.evictions += 1
+            return loaded
+
+    def shard_for(self, wallet):
+        """The (prepared) shard containing `wallet`, or None if it is not in the graph."""
+        k = self.shard_id(wallet)
+        return self.shard(k) if k >= 0 else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.manifest["version"],
+                "shards": self.num_shards,
+                "loaded": list(self._loaded),
+                "max_loaded": self.max_loaded,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+# ------------------------------
+# Aggregation
+# ------------------------------
+def aggregate_transfers(n, src, dst, count, value, fee, first, last, block, token):
+    """
+    Aggregate transfer rows (or already aggregated edge rows, `count` transfers each) between
+    node ids < n into CSR (indptr, indices) plus node and edge columns. The row with the
+    highest block number supplies a pair's last_block and token_type.
+    """
+    nodes = {
+        "incoming_count": np.bincount(dst, weights=count, minlength=n).astype(np.int64),
+        "outgoing_count": np.bincount(src, weights=count, minlength=n).astype(np.int64),
+        "total_sent": np.bincount(src, weights=value, minlength=n),
+        "total_received": np.bincount(dst, weights=value, minlength=n),
+        "risk_score": np.zeros(n, dtype=np.float64),
+    }
+
+    # One edge per distinct (src, dst); unique keys come back sorted by src, then dst (CSR order)
+    pairs, inverse = np.unique(src * n + dst, return_inverse=True)
+    m = len(pairs)
+    edge_src, indices = pairs // max(n, 1), pairs % max(n, 1)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_src, minlength=n), out=indptr[1:])
+
+    first_ts = np.full(m, np.nan)
+    last_ts = np.full(m, np.nan)
+    np.fmin.at(first_ts, inverse, first)
+    np.fmax.at(last_ts, inverse, last)
+    # Latest row per pair: highest block, ties broken by token code, so the result does not
+    # depend on the order rows were loaded in
+    order = np.lexsort((token, block, inverse))
+    last_row = order[np.flatnonzero(np.r_[inverse[order][1:] != inverse[order][:-1], True])] if m else order
+    edges = {
+        "tx_count": np.bincount(inverse, weights=count, minlength=m).astype(np.int64),
+        "total_value": np.bincount(inverse, weights=value, minlength=m),
+        "total_fee": np.bincount(inverse, weights=fee, minlength=m),
+        "first_ts": first_ts,
+        "last_ts": last_ts,
+        "last_block": block[last_row],
+        "token_type": token[last_row],
+    }
+    return indptr, indices.astype(np.int64), nodes, edges
+
+def merge_stores(stores):
+    """
+    Merge stores (e.g. per-partition partial graphs, or a saved graph followed by the
+    partitions ingested since) into one. Aggregates do not depend on the order of `stores`;
+    flags, reasons, risk scores of flagged wallets and closest risk sources carry over, later
+    stores taking precedence. A wallet seen on several chains gets the first in BLOCKCHAINS order (BTC),
+    as in a sequential build that loads BTC first.
+    """
+    stores = list(stores)
+    all_wallets = np.concatenate([np.asarray(store.wallets) for store in stores]) if stores else np.empty(0, dtype="S1")
+    wallets, inverse = np.unique(all_wallets, return_inverse=True)
+    n = len(wallets)
+    offsets = np.cumsum([0] + [store.num_nodes for store in stores])
+
+    parts = []
+    for k, store in enumerate(stores):
+        ids = inverse[offsets[k]:offsets[k + 1]]
+        parts.append((
+            ids[store.edge_sources()], ids[np.asarray(store.indices)],
+            *(np.asarray(store.edges[name]) for name in
+              ("tx_count", "total_value", "total_fee", "first_ts", "last_ts", "last_block", "token_type")),
+        ))
+    if parts:
+        columns = [np.concatenate(column) for column in zip(*parts)]
+    else:
+        columns = [np.empty(0, dtype=t) for t in (np.int64, np.int64, *EDGE_COLUMNS.values())]
+    indptr, indices, nodes, edges = aggregate_transfers(n, *columns)
+
+    blockchain = np.full(n, len(BLOCKCHAINS) - 1, dtype=np.int8)
+    if stores:
+        np.minimum.at(blockchain, inverse, np.concatenate([np.asarray(store.blockchain) for store in stores]))
+    merged = WalletGraphStore(wallets, indptr, indices, nodes, edges, blockchain,
+                              np.zeros(n, dtype=bool), np.full(n, -1, dtype=np.int32), [])
+    for k, store in enumerate(stores):
+        flagged = np.flatnonzero(np.asarray(store.flagged))
+        ids = inverse[offsets[k]:offsets[k + 1]][flagged]
+        merged.flagged[ids] = True
+        merged.nodes["risk_score"][ids] = np.asarray(store.nodes["risk_score"])[flagged]
+        codes = np.asarray(store.reason_codes)[flagged]
+        for code, reason in enumerate(store.reasons):
+            merged.set_reason(ids[codes == code], reason)
+        if store.risk_sources.shape[1]:
+            ids = inverse[offsets[k]:offsets[k + 1]]
+            sources = np.asarray(store.risk_sources)
+            merged.set_risk_sources(ids, np.where(sources >= 0, ids[np.maximum(sources, 0)], -1),
+                                    np.asarray(store.risk_source_hops))
+    return merged
+
+# ------------------------------
+# Builder (chunked ingestion)
+# ------------------------------
+class GraphStoreBuilder:
+    """
+    Accumulates transactions chunk by chunk as flat NumPy arrays (one row per transfer) and
+    aggregates them into a WalletGraphStore in `finish`. Buffered rows are folded into one
+    row per (src, dst) pair every `compact_rows` transfers, so memory follows the number of
+    distinct pairs plus that buffer rather than the number of transfers.
+    """
+
+    def __init__(self, compact_rows=COMPACT_ROWS):
+        self.ids = {}       # wallet -> provisional id, in first-seen order
+        self.chains = []    # BLOCKCHAINS code of the chain each wallet was first seen on
+        self.compact_rows = compact_rows
+        self._chunks = []
+        self._pending = 0     # rows appended since the last compaction
+        self._compacted = 0   # rows in the aggregated chunk
+
+    def intern(self, wallet, blockchain):
+        i = self.ids.get(wallet)
+        if i is None:
+            i = self.ids[wallet] = len(self.ids)
+            self.chains.append(BLOCKCHAINS.index(blockchain))
+        return i
+
+    def add_chunk(self, token_type, blockchain, senders, recipients, values, timestamps, blocks, fees):
+        """Append one chunk of transfers; all sequences are aligned, one entry per transfer."""
+        count = len(senders)
+        src = np.fromiter((self.intern(w, blockchain) for w in senders), dtype=np.int64, count=count)
+        dst = np.fromiter((self.intern(w, blockchain) for w in recipients), dtype=np.int64, count=count)
+        ts = np.fromiter((to_epoch(t) for t in timestamps), dtype=np.float64, count=count)
+        self._chunks.append((
+            src, dst, np.ones(count, dtype=np.int64),
+            np.fromiter((float(v or 0) for v in values), dtype=np.float64, count=count),
+            np.fromiter((float(f or 0) for f in fees), dtype=np.float64, count=count),
+            ts, ts,
+            np.fromiter((b or 0 for b in blocks), dtype=np.int64, count=count),
+            np.full(count, TOKEN_TYPES.index(token_type), dtype=np.int8),
+        ))
+        self._pending += count
+        if self._pending >= max(self.compact_rows, self._compacted):
+            self.compact()
+
+    @property
+    def num_transfers(self):
+        return sum(int(chunk[2].sum()) for chunk in self._chunks)
+
+    def columns(self):
+        """All buffered rows as (src, dst, *EDGE_COLUMNS) arrays over provisional ids."""
+        if self._chunks:
+            return [np.concatenate(column) for column in zip(*self._chunks)]
+        return [np.empty(0, dtype=t) for t in (np.int64, np.int64, *EDGE_COLUMNS.values())]
+
+    def compact(self):
+        """
+        Replace the buffered rows by one aggregated row per (src, dst) pair. aggregate_transfers
+        accepts aggregated rows and does not depend on row order, so `finish` gives the same store.
+        """
+        n = len(self.ids)
+        indptr, indices, _, edges = aggregate_transfers(n, *self.columns())
+        src = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+        self._chunks = [(src, indices, *(edges[name] for name in EDGE_COLUMNS))]
+        self._pending, self._compacted = 0, len(src)
+
+    def finish(self, flagged_wallets=None):
+        """
+        Aggregate all chunks into a WalletGraphStore. `flagged_wallets` maps wallet ->
+        {"reason", "risk_score"} for wallets already flagged in the DB.
+        """
+        n = len(self.ids)
+        wallets = encode_wallets(self.ids)
+        order = np.argsort(wallets, kind="stable")
+        remap = np.empty(n, dtype=np.int64)
+        remap[order] = np.arange(n, dtype=np.int64)
+
+        columns = self.columns()
+        self._chunks, self._pending, self._compacted = [], 0, 0
+        columns[0], columns[1] = remap[columns[0]], remap[columns[1]]
+        indptr, indices, nodes, edges = aggregate_transfers(n, *columns)
+
+        store = WalletGraphStore(wallets[order], indptr, indices, nodes, edges,
+                                 np.array(self.chains, dtype=np.int8)[order],
+                                 np.zeros(n, dtype=bool), np.full(n, -1, dtype=np.int32), [])
+        store.apply_flags(flagged_wallets or {})
+        return store
@@ -0,0 +1,302 @@
+# bench_aml_check.py
+# Load test for the /aml-check path: builds a synthetic flagged_wallets table and
+# wallet graph, starts aml_check.py against them, replays a mix of flagged,
+# unflagged-in-graph and unknown wallets at a target concurrency, and writes
+# latency percentiles and throughput to JSON.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+import networkx as nx
+import psycopg2
+from psycopg2.extras import execute_values
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "..", "src"))
+AML_CHECK = os.path.join(SRC_DIR, "oracle-service", "aml_check.py")
+SCHEMA_SQL = os.path.join(SRC_DIR, "data-helper", "sql-scripts", "create_flagged_wallets_table.sql")
+DEFAULT_MODEL = os.path.join(SRC_DIR, "ml-layer", "wallet_gcn_model.pth")
+# flagged_wallets is truncated before each run; any other database needs --allow-truncate
+BENCH_DB_NAME = "aml_bench"
+
+sys.path.insert(0, os.path.join(SRC_DIR, "wallet-Graph"))
+from wallet_graph_store import WalletGraphStore
+
+# =====================
+# Synthetic data
+# =====================
+def wallet_id(i):
+    return f"0x{i:040x}"
+
+def build_synthetic_graph(num_nodes, avg_degree, flagged_fraction, seed):
+    """Directed wallet graph with a heavy-tailed degree distribution and graph_builder's node attributes."""
+    rng = random.Random(seed)
+    G = nx.DiGraph()
+    for i in range(num_nodes):
+        G.add_node(wallet_id(i), flagged=False, flagged_reason=None, risk_score=0, blockchain="ETH",
+                   incoming_count=0, outgoing_count=0, total_received=0, total_sent=0)
+
+    # Preferential targets: a few hub wallets (exchanges, contracts) receive most transfers
+    weights = [1.0 / (i + 1) ** 0.8 for i in range(num_nodes)]
+    targets = rng.choices(range(num_nodes), weights=weights, k=num_nodes * avg_degree)
+    for dst in targets:
+        src = rng.randrange(num_nodes)
+        if src == dst:
+            continue
+        u, v = wallet_id(src), wallet_id(dst)
+        value = rng.lognormvariate(3, 2)
+        G.add_edge(u, v, tx_hash=f"0x{rng.getrandbits(256):064x}", value=value, timestamp="",
+                   token_type="ETH_native", block_number=0, fee=None)
+        G.nodes[u]["outgoing_count"] += 1
+        G.nodes[u]["total_sent"] += value
+        G.nodes[v]["incoming_count"] += 1
+        G.nodes[v]["total_received"] += value
+
+    flagged = rng.sample(list(G.nodes), int(num_nodes * flagged_fraction))
+    for w in flagged:
+        G.nodes[w].update(flagged=True, flagged_reason="Synthetic benchmark flag", risk_score=10)
+    return G, flagged
+
+def ensure_database(db_config):
+    conn = psycopg2.connect(**dict(db_config, dbname="postgres"))
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_config["dbname"],))
+    if cur.fetchone() is None:
+        cur.execute(f'CREATE DATABASE "{db_config["dbname"]}"')
+    cur.close()
+    conn.close()
+
+def load_flagged_table(db_config, flagged):
+    ensure_database(db_config)
+    conn = psycopg2.connect(**db_config)
+    cur = conn.cursor()
+    with open(SCHEMA_SQL, "r", encoding="utf-8") as f:
+        cur.execute(f.read())
+    cur.execute("TRUNCATE flagged_wallets;")
+    execute_values(cur, "INSERT INTO flagged_wallets (wallet_id, reason, risk_score) VALUES %s",
+                   [(w, "Synthetic benchmark flag", 10) for w in flagged])
+    conn.commit()
+    cur.close()
+    conn.close()
+
+# =====================
+# Server
+# =====================
+def start_server(args, graph_dir, workdir):
+    env = dict(os.environ,
+               AML_PORT=str(args.port),
+               AML_DB_NAME=args.db_name, AML_DB_USER=args.db_user, AML_DB_PASSWORD=args.db_password,
+               AML_DB_HOST=args.db_host, AML_DB_PORT=str(args.db_port),
+               AML_GRAPH_DIR=graph_dir, AML_MODEL_PATH=args.model,
+               AML_RISK_TABLE_DIR=os.path.join(workdir, "risk_table"),
+               AML_FEATURE_STORE_DIR=os.path.join(workdir, "feature_store"))
+    env.update(dict(kv.split("=", 1) for kv in args.server_env))
+    log = open(os.path.join(workdir, "server.log"), "w", encoding="utf-8")
+    proc = subprocess.Popen([sys.executable, AML_CHECK], env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"aml_check.py exited with {proc.returncode}; see {log.name}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{args.port}/readyz", timeout=1):
+                return proc, log
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"aml_check.py not ready after {args.startup_timeout}s; see {log.name}")
+
+# =====================
+# Load generation
+# =====================
+def build_workload(args, G, flagged, seed):
+    """List of (kind, payload): kind is flagged, in_graph or unknown."""
+    rng = random.Random(seed + 1)
+    flagged_set = set(flagged)
+    clean = [w for w in G.nodes if w not in flagged_set]
+    mix = [("flagged", args.mix_flagged), ("in_graph", args.mix_in_graph), ("unknown", args.mix_unknown)]
+    kinds, weights = zip(*mix)
+
+    workload = []
+    for _ in range(args.requests):
+        kind = rng.choices(kinds, weights=weights)[0]
+        if kind == "flagged":
+            sender, recipient = rng.choice(flagged), rng.choice(clean)
+        elif kind == "in_graph":
+            sender, recipient = rng.choice(clean), rng.choice(clean)
+        else:
+            sender, recipient = f"unknown{rng.getrandbits(64):x}", f"unknown{rng.getrandbits(64):x}"
+        workload.append((kind, {"sender": sender, "recipient": recipient, "amount": "1000", "denom": "ustake"}))
+    return workload
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3) if values else None,
+        "p95_ms": round(percentile(values, 95) * 1000, 3) if values else None,
+        "p99_ms": round(percentile(values, 99) * 1000, 3) if values else None,
+        "max_ms": round(values[-1] * 1000, 3) if values else None,
+    }
+
+def replay(args, workload):
+    url = f"http://127.0.0.1:{args.port}/aml-check"
+    next_index = iter(range(len(workload)))
+    lock = threading.Lock()
+    latencies = {"all": [], "flagged": [], "in_graph": [], "unknown": []}
+    errors = []
+    partial = [0]
+
+    def worker():
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            kind, payload = workload[i]
+            request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                             headers={"Content-Type": "application/json"})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=args.request_timeout) as resp:
+                    verdict = json.loads(resp.read())
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            with lock:
+                latencies["all"].append(elapsed)
+                latencies[kind].append(elapsed)
+                partial[0] += bool(verdict.get("partial"))
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    return {
+        "wall_secs": round(wall, 3),
+        "requests_per_sec": round(len(latencies["all"]) / wall, 2) if wall else None,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "partial_verdicts": partial[0],
+        "latency": {kind: summarize(values) for kind, values in latencies.items()},
+    }
+
+def compare(result, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    deltas = {}
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        new, old = result["latency"]["all"][key], baseline["latency"]["all"][key]
+        if new is not None and old:
+            deltas[key] = f"{(new - old) / old * 100:+.1f}%"
+    old_rps = baseline.get("requests_per_sec")
+    if old_rps:
+        deltas["requests_per_sec"] = f"{(result['requests_per_sec'] - old_rps) / old_rps * 100:+.1f}%"
+    return deltas
+
+# =====================
+# Main
+# =====================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /aml-check endpoint")
+    parser.add_argument("--nodes", type=int, default=50_000, help="wallets in the synthetic graph")
+    parser.add_argument("--avg-degree", type=int, default=4, help="transfers per wallet")
+    parser.add_argument("--flagged-fraction", type=float, default=0.02)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix-flagged", type=float, default=0.2, help="share of requests with a flagged sender")
+    parser.add_argument("--mix-in-graph", type=float, default=0.5, help="share with unflagged wallets in the graph (ML path)")
+    parser.add_argument("--mix-unknown", type=float, default=0.3, help="share with wallets not in the graph")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=6100)
+    parser.add_argument("--db-name", default=BENCH_DB_NAME)
+    parser.add_argument("--allow-truncate", action="store_true",
+                        help=f"allow wiping flagged_wallets in a database other than {BENCH_DB_NAME}")
+    parser.add_argument("--db-user", default="postgres")
+    parser.add_argument("--db-password", default="password")
+    parser.add_argument("--db-host", default="localhost")
+    parser.add_argument("--db-port", type=int, default=5433)
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="GCN checkpoint served during the run")
+    parser.add_argument("--server-env", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="extra environment for aml_check.py, e.g. AML_WORKERS=32")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "results", "aml_check_bench.json"))
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    args = parser.parse_args()
+    if args.db_name != BENCH_DB_NAME and not args.allow_truncate:
+        parser.error(f"the benchmark truncates {args.db_name}.flagged_wallets; pass --allow-truncate to use a database other than {BENCH_DB_NAME}")
+
+    db_config = {"dbname": args.db_name, "user": args.db_user, "password": args.db_password,
+                 "host": args.db_host, "port": args.db_port}
+
+    workdir = tempfile.mkdtemp(prefix="aml_bench_")
+    print(f"[BENCH] Building synthetic graph ({args.nodes} wallets) in {workdir}")
+    G, flagged = build_synthetic_graph(args.nodes, args.avg_degree, args.flagged_fraction, args.seed)
+    graph_dir = os.path.join(workdir, "wallet_graph")
+    WalletGraphStore.from_networkx(G).save_artifact(graph_dir, {
+        "provenance": {"builder": "bench_aml_check.py", "mode": "synthetic", "seed": args.seed},
+    })
+
+    print(f"[BENCH] Loading {len(flagged)} flagged wallets into {args.db_name}.flagged_wallets")
+    load_flagged_table(db_config, flagged)
+
+    print("[BENCH] Starting aml_check.py and waiting for /readyz")
+    proc, log = start_server(args, graph_dir, workdir)
+    try:
+        workload = build_workload(args, G, flagged, args.seed)
+        print(f"[BENCH] Replaying {len(workload)} requests at concurrency {args.concurrency}")
+        result = replay(args, workload)
+        with urllib.request.urlopen(f"http://127.0.0.1:{args.port}/metrics", timeout=5) as resp:
+            metrics_text = resp.read().decode()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        log.close()
+
+    result = {
+        "run_at": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("db_password", "output", "baseline")},
+        "graph": {"nodes": G.number_of_nodes(), "edges": G.number_of_edges(), "flagged": len(flagged)},
+        **result,
+    }
+    if args.baseline:
+        result["vs_baseline"] = compare(result, args.baseline)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    with open(os.path.splitext(args.output)[0] + ".metrics.txt", "w", encoding="utf-8") as f:
+        f.write(metrics_text)
+
+    overall = result["latency"]["all"]
+    print(f"[BENCH] {result['requests_per_sec']} req/s, p50={overall['p50_ms']}ms "
+          f"p95={overall['p95_ms']}ms p99={overall['p99_ms']}ms, errors={result['errors']}")
+    if args.baseline:
+        print(f"[BENCH] vs baseline: {result['vs_baseline']}")
+    print(f"[BENCH] Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()